@@ -0,0 +1,164 @@
+# benchmarks.py - Mesures de performance des fonctions de cv_functions
+#
+# Usage : python benchmarks.py [nom_du_benchmark ...]
+
+import io
+import sys
+import time
+import tracemalloc
+
+from docx import Document
+
+import cv_functions
+
+
+def lire_fichier_word_python_docx(fichier_word) -> str:
+    """Implémentation de référence (modèle objet python-docx), conservée pour comparaison"""
+    doc = Document(fichier_word)
+    texte = ""
+
+    for paragraph in doc.paragraphs:
+        texte += paragraph.text + "\n"
+
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                texte += cell.text + " "
+            texte += "\n"
+
+    return texte.strip()
+
+
+def mesurer(fonction, *args, repetitions: int = 20):
+    """Retourne (durée médiane en ms, pic mémoire en Ko, résultat) d'un appel"""
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction(*args)
+        durees.append((time.perf_counter() - debut) * 1000)
+
+    tracemalloc.start()
+    fonction(*args)
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durees.sort()
+    return durees[len(durees) // 2], pic / 1024, resultat
+
+
+def bench_lecture_word(chemin: str = "CV-Donald-FEUZING-NTEMMA-2024.docx"):
+    """Lecteur iterparse (cv_functions.iterer_blocs_word) contre python-docx"""
+    with open(chemin, "rb") as f:
+        donnees = f.read()
+
+    def lecteur_iterparse(octets):
+        return "\n".join(cv_functions.iterer_blocs_word(io.BytesIO(octets))).strip()
+
+    def lecteur_python_docx(octets):
+        return lire_fichier_word_python_docx(io.BytesIO(octets))
+
+    print(f"Lecture Word : {chemin} ({len(donnees) / 1024:.0f} Ko)")
+    for nom, lecteur in (("python-docx", lecteur_python_docx), ("iterparse", lecteur_iterparse)):
+        duree_ms, pic_ko, texte = mesurer(lecteur, donnees)
+        lignes = [ligne for ligne in texte.splitlines() if ligne.strip()]
+        doublons = len(lignes) - len(set(lignes))
+        print(f"  {nom:<12} {duree_ms:8.2f} ms   pic {pic_ko:8.0f} Ko   "
+              f"{len(texte):6d} car.   {doublons} lignes dupliquées")
+
+
+def bench_analyse_clic(chemin: str = "CV-Donald-FEUZING-NTEMMA-2024.docx"):
+    """Travail d'analyse par clic sur « Analyser et Générer » : avant et après les analyses mémorisées"""
+    with open(chemin, "rb") as f:
+        texte_cv = cv_functions.lire_fichier_word.__wrapped__(io.BytesIO(f.read()))
+    texte_mission = texte_cv[: len(texte_cv) // 3]
+
+    taxonomie = cv_functions.obtenir_taxonomie()
+
+    def clic_sans_memo():
+        # Enchaînement d'origine : l'interface, le rapport puis le score relancent chacun les deux scans
+        scans = 0
+        for _ in range(3):
+            scores = taxonomie.scorer_domaines_mission(texte_mission)
+            domaine = cv_functions.domaine_principal(scores)
+            scan = taxonomie.moteur.rechercher(texte_cv)
+            if domaine in taxonomie.categories_par_domaine:
+                taxonomie.categories_depuis_scan(scan, domaine)
+            scans += 2
+        return scans
+
+    def clic_avec_memo():
+        avant = sum(cv_functions.compteurs_analyses[c] for c in ("scans_mission", "scans_cv"))
+        analyse_mission = cv_functions.analyser_mission(texte_mission)
+        analyse_cv = cv_functions.analyser_cv(texte_cv)
+        analyse_cv.categories(analyse_mission.domaine)
+        cv_functions.generer_rapport_optimisation(texte_cv, {}, texte_mission)
+        cv_functions.calculer_score_adequation(texte_cv, texte_mission)
+        return sum(cv_functions.compteurs_analyses[c] for c in ("scans_mission", "scans_cv")) - avant
+
+    def clic_avec_memo_froid():
+        cv_functions._analyses = cv_functions.CacheLRU(cv_functions.NB_ANALYSES_EN_CACHE)
+        return clic_avec_memo()
+
+    print(f"Analyse par clic : mission {len(texte_mission)} car., dossier {len(texte_cv)} car.")
+    for nom, clic in (("sans mémo", clic_sans_memo), ("mémo, 1er clic", clic_avec_memo_froid),
+                      ("mémo, re-clic", clic_avec_memo)):
+        duree_ms, pic_ko, scans = mesurer(clic)
+        print(f"  {nom:<15} {duree_ms:8.2f} ms   pic {pic_ko:8.0f} Ko   {scans} scan(s) complet(s)")
+
+
+def bench_prompt(chemin: str = "CV-Donald-FEUZING-NTEMMA-2024.docx"):
+    """Taille du prompt unique : catalogue complet des catégories contre consignes des domaines détectés"""
+    with open(chemin, "rb") as f:
+        texte_cv = cv_functions.lire_fichier_word.__wrapped__(io.BytesIO(f.read()))
+    texte_mission = texte_cv[: len(texte_cv) // 3]
+    dossier, _ = cv_functions.preparer_dossier_pour_prompt(texte_cv)
+
+    taxonomie = cv_functions.obtenir_taxonomie()
+    domaines = cv_functions.analyser_mission(texte_mission, taxonomie).domaines
+
+    def prompt_catalogue_complet():
+        return cv_functions.generer_prompt_optimisation(texte_mission, dossier, None, taxonomie)
+
+    def prompt_domaines_detectes():
+        return cv_functions.generer_prompt_optimisation(texte_mission, dossier, domaines, taxonomie)
+
+    def prompt_sans_cache():
+        cv_functions._consignes_prompt_optimisation.cache_clear()
+        cv_functions.rendre_exemples_categories.cache_clear()
+        return prompt_domaines_detectes()
+
+    print(f"Prompt unique : domaines détectés {', '.join(d for d, _ in domaines) or 'aucun'}")
+    for nom, construire in (("catalogue", prompt_catalogue_complet), ("domaines", prompt_domaines_detectes),
+                            ("sans cache", prompt_sans_cache)):
+        duree_ms, pic_ko, prompt = mesurer(construire)
+        print(f"  {nom:<12} {duree_ms:8.3f} ms   pic {pic_ko:8.0f} Ko   "
+              f"{cv_functions.estimer_nombre_tokens(prompt):6d} tokens estimés")
+
+
+def bench_exigence():
+    """Niveaux d'exigence lus sur le texte de mission tel que l'application l'analyse (après nettoyage)"""
+    texte_mission = ("Compétences obligatoires :\n• Python\n• Docker\n"
+                     "Atouts :\n• Kubernetes")
+    attendus = {'python': 'obligatoire', 'docker': 'obligatoire', 'kubernetes': 'souhaitée'}
+
+    texte_nettoye = cv_functions.nettoyer_texte_mission(texte_mission)
+    analyse = cv_functions.analyser_mission(texte_nettoye)
+    niveaux = {competence: detail['exigence'] for competence, detail in analyse.competences.items()}
+    print("Niveaux d'exigence après nettoyer_texte_mission :")
+    for competence, attendu in attendus.items():
+        print(f"  {competence:<12} {niveaux.get(competence, 'absente'):<12} (attendu : {attendu})")
+    assert all(niveaux.get(c) == attendu for c, attendu in attendus.items()), \
+        "nettoyer_texte_mission ne doit pas effacer les intitulés de liste ni les puces"
+
+
+BENCHMARKS = {
+    "word": bench_lecture_word,
+    "analyse": bench_analyse_clic,
+    "prompt": bench_prompt,
+    "exigence": bench_exigence,
+}
+
+
+if __name__ == "__main__":
+    for nom in sys.argv[1:] or list(BENCHMARKS):
+        BENCHMARKS[nom]()
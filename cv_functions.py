@@ -8,31 +8,159 @@ from docx.oxml.shared import OxmlElement, qn
 from docx.oxml.ns import nsdecls
 from docx.oxml import parse_xml
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
 import datetime
 import os
 import io
-from openai import OpenAI
+import asyncio
+import bisect
+import codecs
+import hashlib
+import functools
+import inspect
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import multiprocessing
+import zipfile
+from array import array
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from collections import OrderedDict, Counter, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from openai import AsyncOpenAI, OpenAI
+import httpx
 import PyPDF2
-from typing import Optional, Dict, Any
+from PyPDF2.generic import IndirectObject, StreamObject
+import numpy as np
+from scipy import sparse
+from lxml import etree
+from typing import Optional, Dict, Any, List, Iterator, Callable, Tuple
 
 
 # === FONCTIONS UTILITAIRES INTÉGRÉES ===
 
+SIGNATURE_PDF = b"%PDF-"
+SIGNATURE_ZIP = b"PK\x03\x04"
+TAILLE_ENTETE_SNIFFING = 8192
+PAGES_MAX_PDF = 200
+TAILLE_MAX_DECOMPRESSEE_DOCX_MB = 100
+
+def _taille_fichier(fichier) -> int:
+    """Taille du fichier obtenue par seek/tell, sans copier son contenu"""
+    position = fichier.tell()
+    fichier.seek(0, os.SEEK_END)
+    taille = fichier.tell()
+    fichier.seek(position)
+    return taille
+
+def _lire_entete(fichier, nb_octets: int = TAILLE_ENTETE_SNIFFING) -> bytes:
+    position = fichier.tell()
+    fichier.seek(0)
+    entete = fichier.read(nb_octets)
+    fichier.seek(position)
+    return entete.encode('utf-8') if isinstance(entete, str) else entete
+
+def detecter_type_contenu(fichier) -> Optional[str]:
+    """Identifie le format réel d'un fichier à partir de ses premiers octets ('pdf', 'docx', 'txt')"""
+    entete = _lire_entete(fichier)
+
+    if entete.startswith(SIGNATURE_PDF):
+        return 'pdf'
+
+    if entete.startswith(SIGNATURE_ZIP):
+        try:
+            fichier.seek(0)
+            with zipfile.ZipFile(fichier) as archive:
+                # Le répertoire central est lu en fin de fichier, sans décompresser les parties
+                noms = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return None
+        finally:
+            fichier.seek(0)
+        if '[Content_Types].xml' in noms and 'word/document.xml' in noms:
+            return 'docx'
+        return None
+
+    # Texte : pas d'octet nul hors encodages UTF-16/32 annoncés par un BOM
+    if entete.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)) or b"\x00" not in entete:
+        return 'txt'
+    return None
+
+def _verifier_structure_pdf(fichier) -> Optional[str]:
+    """Contrôle le trailer du PDF avant toute extraction ; retourne un message d'erreur ou None"""
+    taille = _taille_fichier(fichier)
+    fichier.seek(max(0, taille - 1024))
+    fin_fichier = fichier.read()
+    fichier.seek(0)
+    if b"%%EOF" not in fin_fichier:
+        return "PDF tronqué ou malformé (marqueur %%EOF absent)"
+
+    try:
+        # PdfReader ne lit ici que la table xref et le trailer, pas le contenu des pages
+        pdf_reader = PyPDF2.PdfReader(fichier)
+        if pdf_reader.is_encrypted:
+            return "PDF protégé par mot de passe"
+        nb_pages = int(pdf_reader.trailer['/Root']['/Pages']['/Count'])
+    except Exception as e:
+        return f"PDF malformé ({str(e)})"
+    finally:
+        fichier.seek(0)
+
+    if nb_pages > PAGES_MAX_PDF:
+        return f"PDF trop long ({nb_pages} pages). Maximum: {PAGES_MAX_PDF} pages"
+    return None
+
+def _verifier_structure_docx(fichier) -> Optional[str]:
+    """Refuse les archives dont le contenu décompressé serait démesuré (zip bombs)"""
+    try:
+        fichier.seek(0)
+        with zipfile.ZipFile(fichier) as archive:
+            taille_decompressee = sum(info.file_size for info in archive.infolist())
+    except zipfile.BadZipFile as e:
+        return f"Document Word malformé ({str(e)})"
+    finally:
+        fichier.seek(0)
+
+    if taille_decompressee > TAILLE_MAX_DECOMPRESSEE_DOCX_MB * 1024 * 1024:
+        return f"Document Word trop volumineux une fois décompressé ({taille_decompressee / (1024 * 1024):.0f} MB)"
+    return None
+
 def valider_fichier_upload(fichier, types_autorises: list, taille_max_mb: int = 10) -> bool:
     """Valide un fichier uploadé selon les critères spécifiés"""
     if not fichier:
         return False
-    
+
     extension = fichier.name.split('.')[-1].lower()
     if extension not in types_autorises:
         st.error(f"Type de fichier non autorisé. Extensions acceptées: {', '.join(types_autorises)}")
         return False
-    
-    taille_mb = len(fichier.getvalue()) / (1024 * 1024)
+
+    taille_mb = _taille_fichier(fichier) / (1024 * 1024)
     if taille_mb > taille_max_mb:
         st.error(f"Fichier trop volumineux ({taille_mb:.1f} MB). Taille max: {taille_max_mb} MB")
         return False
-    
+
+    type_contenu = detecter_type_contenu(fichier)
+    if type_contenu != extension:
+        st.error(f"Le contenu du fichier ne correspond pas à l'extension .{extension}")
+        return False
+
+    if type_contenu == 'pdf':
+        erreur = _verifier_structure_pdf(fichier)
+    elif type_contenu == 'docx':
+        erreur = _verifier_structure_docx(fichier)
+    else:
+        erreur = None
+
+    if erreur:
+        st.error(erreur)
+        return False
+
     return True
 
 def nettoyer_texte_mission(texte: str) -> str:
@@ -40,256 +168,956 @@ def nettoyer_texte_mission(texte: str) -> str:
     if not texte:
         return ""
     
-    # Supprimer les caractères de contrôle et espaces excessifs
-    texte = re.sub(r'\s+', ' ', texte)
-    texte = re.sub(r'[^\w\s\-\.,:;!?\(\)\/àâäéèêëïîôöùûüÿç]', '', texte)
-    texte = re.sub(r'\n\s*\n', '\n\n', texte)
+    # Supprimer les caractères de contrôle et espaces excessifs ; les retours à la ligne et les puces
+    # sont conservés : niveaux_exigence s'appuie sur les intitulés de liste et les puces
+    texte = re.sub(r'[^\S\n]+', ' ', texte)
+    texte = re.sub(r'[^\w\s\-\.,:;!?\(\)\/#\+•àâäéèêëïîôöùûüÿç]', '', texte)
+    texte = re.sub(r' ?\n ?', '\n', texte)
+    texte = re.sub(r'\n{3,}', '\n\n', texte)
     
     return texte.strip()
 
-def detecter_domaine_mission(texte_mission: str) -> str:
-    """Détecte le domaine d'activité principal ET la spécialisation de la mission"""
-    domaines_keywords = {
-        'Développement & Programmation': [
-            'développeur', 'programmeur', 'software engineer', 'application', 'coding', 'javascript',
-            'python', 'java', 'c#', 'php', 'react', 'angular', 'vue', 'node', 'backend', 'frontend',
-            'fullstack', 'api', 'rest', 'mvc', 'framework', 'développement logiciel', 'programmation'
-        ],
-        'DevOps & Infrastructure': [
-            'devops', 'infrastructure', 'cloud', 'aws', 'azure', 'gcp', 'docker', 'kubernetes',
-            'ci/cd', 'jenkins', 'gitlab', 'terraform', 'ansible', 'monitoring', 'deployment',
-            'orchestration', 'containerisation', 'microservices architecture'
-        ],
-        'Cybersécurité': [
-            'cybersécurité', 'sécurité informatique', 'securité', 'pentest', 'audit sécurité',
-            'security', 'firewall', 'antivirus', 'intrusion', 'vulnerability', 'iso 27001',
-            'cissp', 'ethical hacking', 'forensic', 'siem', 'sox', 'gdpr compliance'
-        ],
-        'Intelligence Artificielle & Data': [
-            'intelligence artificielle', 'machine learning', 'deep learning', 'ia', 'ai',
-            'data science', 'data scientist', 'tensorflow', 'pytorch', 'scikit-learn',
-            'nlp', 'computer vision', 'neural network', 'algorithme', 'big data', 'analytics'
-        ],
-        'Business Intelligence & Analytics': [
-            'business intelligence', 'bi', 'power bi', 'tableau', 'qlik', 'reporting',
-            'dashboard', 'kpi', 'data visualization', 'etl', 'data warehouse', 'olap',
-            'analyse prédictive', 'data mining', 'sql server analysis services'
-        ],
-        'Architecture & Systèmes': [
-            'architecte', 'architecture logicielle', 'système', 'enterprise architect',
-            'solution architect', 'technical architect', 'patterns', 'scalabilité',
-            'performance', 'haute disponibilité', 'load balancing', 'distributed systems'
-        ],
-        'Marketing Digital': [
-            'marketing digital', 'marketing', 'communication', 'campagne', 'publicité', 'brand',
-            'social media', 'seo', 'sem', 'analytics', 'crm', 'lead', 'conversion', 'content marketing',
-            'google ads', 'facebook ads', 'inbound marketing'
-        ],
-        'Finance': [
-            'finance', 'comptabilité', 'budget', 'trésorerie', 'audit', 'contrôle gestion',
-            'reporting financier', 'analyse financière', 'investissement', 'risque', 'ifrs',
-            'consolidation', 'fiscalité', 'treasury'
-        ],
-        'Ressources Humaines': [
-            'ressources humaines', 'rh', 'recrutement', 'formation', 'paie', 'talent',
-            'compétences', 'évaluation', 'carrière', 'mobilité', 'sirh', 'talent management',
-            'people analytics', 'workforce planning'
-        ],
-        'Logistique & Supply Chain': [
-            'logistique', 'supply chain', 'approvisionnement', 'stock', 'transport',
-            'entreposage', 'distribution', 'procurement', 'planification', 'wms',
-            'inventory management', 'lean', 'six sigma'
-        ],
-        'Consulting & Stratégie': [
-            'consultant', 'conseil', 'stratégie', 'transformation', 'audit',
-            'accompagnement', 'optimisation', 'expertise', 'change management',
-            'business transformation', 'process improvement'
-        ],
-        'Santé & Médical': [
-            'médical', 'santé', 'patient', 'soins', 'clinique', 'hôpital',
-            'pharmacie', 'thérapie', 'diagnostic', 'healthcare', 'medical device',
-            'clinical trial', 'regulatory affairs'
-        ],
-        'Éducation & Formation': [
-            'formation', 'enseignement', 'pédagogie', 'cours', 'étudiant',
-            'apprentissage', 'curriculum', 'évaluation pédagogique', 'e-learning',
-            'lms', 'instructional design', 'education technology'
-        ],
-        'Juridique & Compliance': [
-            'juridique', 'droit', 'contrat', 'compliance', 'réglementation',
-            'contentieux', 'avocat', 'juriste', 'legal', 'governance',
-            'risk management', 'audit compliance'
-        ]
-    }
-    
-    texte_lower = texte_mission.lower()
-    scores = {}
-    
-    for domaine, keywords in domaines_keywords.items():
-        score = sum(1 for keyword in keywords if keyword in texte_lower)
-        if score > 0:
-            scores[domaine] = score
-    
+# === CACHE MÉMOIRE ===
+
+class CacheLRU:
+    """Cache mémoire borné en nombre d'entrées, éviction du moins récemment utilisé"""
+
+    def __init__(self, nb_entrees_max: int):
+        self.nb_entrees_max = nb_entrees_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        with self._verrou:
+            if cle not in self._entrees:
+                return None
+            self._entrees.move_to_end(cle)
+            return self._entrees[cle]
+
+    def enregistrer(self, cle, valeur):
+        with self._verrou:
+            self._entrees[cle] = valeur
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.nb_entrees_max:
+                self._entrees.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entrees)
+
+# === RECHERCHE MULTI-MOTIFS ===
+
+class AutomateAhoCorasick:
+    """Automate d'Aho-Corasick : toutes les occurrences de tous les motifs en un seul passage
+
+    Les motifs sont des séquences quelconques (chaînes de caractères ou suites d'identifiants),
+    associées chacune à une valeur restituée lors des correspondances.
+    """
+
+    def __init__(self, motifs: Dict[Any, Any]):
+        self._transitions = [{}]
+        self._echecs = [0]
+        self._sorties = [[]]
+
+        for motif, valeur in motifs.items():
+            etat = 0
+            for symbole in motif:
+                suivant = self._transitions[etat].get(symbole)
+                if suivant is None:
+                    suivant = len(self._transitions)
+                    self._transitions[etat][symbole] = suivant
+                    self._transitions.append({})
+                    self._echecs.append(0)
+                    self._sorties.append([])
+                etat = suivant
+            self._sorties[etat].append((len(motif), valeur))
+
+        # Liens d'échec calculés en largeur : plus long suffixe propre présent dans l'arbre
+        file_attente = deque(self._transitions[0].values())
+        while file_attente:
+            etat = file_attente.popleft()
+            for symbole, suivant in self._transitions[etat].items():
+                file_attente.append(suivant)
+                echec = self._echecs[etat]
+                while echec and symbole not in self._transitions[echec]:
+                    echec = self._echecs[echec]
+                self._echecs[suivant] = self._transitions[echec].get(symbole, 0)
+                self._sorties[suivant] = self._sorties[suivant] + self._sorties[self._echecs[suivant]]
+
+    def rechercher(self, sequence) -> Iterator[Tuple[int, Any]]:
+        """Produit (position de début, valeur) pour chaque occurrence d'un motif"""
+        transitions, echecs, sorties = self._transitions, self._echecs, self._sorties
+        etat = 0
+        for position, symbole in enumerate(sequence):
+            while etat and symbole not in transitions[etat]:
+                etat = echecs[etat]
+            etat = transitions[etat].get(symbole, 0)
+            if sorties[etat]:
+                for longueur, valeur in sorties[etat]:
+                    yield position - longueur + 1, valeur
+
+# === MOTEUR DE CORRESPONDANCE PAR TOKENS ===
+
+# Caractères qui restent collés au token quand ils apparaissent dans un mot-clé (c#, c++, .net, ci/cd)
+CARACTERES_TOKENS_SPECIAUX = "#+./"
+# Lettres suivies d'éventuels accents combinants (texte extrait de PDF en forme décomposée) ;
+# les élisions (j', n', l', d', qu'...) sont écartées : « J'ai » ne donne que le token « ai » ;
+# les sigles reliés par & (R&D, AT&T) forment un seul token
+MOTIF_MOT = r"(?<![\w\u0300-\u036f])(?!(?:[cdjlmnst]|qu)['’]\w)\w[\w\u0300-\u036f]*(?:&\w[\w\u0300-\u036f]*)*"
+
+# Mots-clés d'une ou deux lettres (r, go, ia, bi) : retenus seulement en majuscules (« R », « Go »)
+# ou au milieu d'une énumération de compétences, jamais dans un composé (R&D, go-to-market)
+# ni après j' / n' (« J'ai », « n'ai »)
+LONGUEUR_MAX_TOKEN_COURT = 2
+CARACTERES_COMPOSES = "-&"
+ELISIONS_VERBALES = ("j'", "j’", "n'", "n’")
+# Pluriel d'un mot-clé de trois lettres au plus : retenu seulement hors minuscules (« APIs »,
+# mais pas « vues » pour 'vue')
+LONGUEUR_MAX_FLEXION_COURTE = 4
+
+def normaliser_texte(texte: str) -> str:
+    """Décomposition NFKD, accents retirés, casse ignorée ; sans cache, pour des phrases ou lignes entières"""
+    if texte.isascii():
+        return texte.lower()
+    decompose = unicodedata.normalize('NFKD', texte)
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).casefold()
+
+@functools.lru_cache(maxsize=65536)
+def normaliser_token(token: str) -> str:
+    """Forme canonique d'un token (voir normaliser_texte), mémorisée : les mêmes tokens reviennent sans cesse"""
+    return normaliser_texte(token)
+
+# Tolérance aux fautes de frappe et d'OCR : distance d'édition maximale selon la longueur du token
+LONGUEUR_MIN_CORRECTION = 7
+LONGUEUR_MIN_DISTANCE_2 = 12
+NB_CORRECTIONS_EN_CACHE = 8192
+
+# Similarité minimale (1 - distance / longueur) entre un token et sa correction
+SIMILARITE_MIN_CORRECTION = 0.85
+
+# Mots courants des missions et dossiers (français et anglais) : des mots corrects, jamais corrigés
+# vers un mot-clé voisin (« projet » n'est pas une faute de « project »)
+MOTS_COURANTS = frozenset(normaliser_token(mot) for mot in """
+    activité activités actuel actuelle actuellement administration affaires afin agile analyse analyser
+    analyste analystes annuel application applications apprendre approche architecte assistance assurer
+    attendu attendus autonome autonomie besoin besoins bonnes business cahier capacité certaines
+    charges client clients collaborer collaboration comité communication compétence compétences concevoir
+    conception conduite conseil conseils construire contexte continu contrat contrôle coordination
+    création créer culture démarche démarches déploiement déployer description développement
+    développer développé développeurs différents diplôme direction documentation documents données
+    efficace efficacité encadrement encadrer enjeux ensemble entreprise entreprises environnement
+    équipe équipes essentiel établir études évaluation évolution exécution exigences expérience
+    expériences expert expertise exploitation externe fonctionnel fonctionnelle fonctionnelles fonctionnels
+    formation formations fournir garantir gestion gouvernance groupe industriel information informations
+    infrastructure ingénieur ingénieurs initiative innovation intégration interne interlocuteur
+    langue langues livrables logiciel maintenance maîtrise maîtriser management manager méthode
+    méthodes méthodo méthodologie métier métiers mettre mission missions mobilité niveau niveaux nombreux
+    nouveau nouveaux nouvelle nouvelles objectif objectifs opérationnel opérationnelle organisation
+    outils participer performance périmètre personnel pilotage piloter plusieurs politique poste
+    pratique pratiques prestataire prestation principal principale principales principaux priorité
+    problèmes procédures processus production produit produits professionnel profil programme
+    progression projet projets proposer qualité recherche recruter recrutement réaliser réalisation
+    réalisations référent relation rédaction rédiger réglementaire rigoureux rôle sécurité service
+    services solution solutions souhaité souhaitée spécifications stratégie stratégique structure
+    suivre suivi support supports système systèmes technique techniques technologie technologies
+    tester traitement transformation transverse travail travailler utilisateur utilisateurs validation
+    valider
+    ability across activities analysis analyst applications approach assist business candidate
+    company contract customer customers delivery deploy design develop developed developing
+    development engineer engineering environment experience experienced expertise focused improve
+    knowledge leading management manager methods operations principles process processes product
+    products project projects provide quality recruiter recruiting requirements responsible
+    services skills solutions strong support systems technical technology testing understanding
+    within working
+""".split())
+
+# Suffixes de flexion et de dérivation, du plus long au plus court
+SUFFIXES_FLEXION = ('ements', 'ement', 'ations', 'ation', 'euses', 'euse', 'eurs', 'eur', 'ment',
+                    'ing', 'ant', 'ees', 'ee', 'er', 'ed')
+
+def _singulier(token: str) -> str:
+    """Token sans sa marque de pluriel (« pipelines » → « pipeline »)"""
+    if len(token) > 3 and token[-1] in "sx" and token[-2] != "s":
+        return token[:-1]
+    return token
+
+@functools.lru_cache(maxsize=65536)
+def _radical(token: str) -> str:
+    """Radical approximatif : pluriel puis suffixe de flexion retirés (« développer » → « developp »)"""
+    token = _singulier(token)
+    for suffixe in SUFFIXES_FLEXION:
+        if token.endswith(suffixe) and len(token) - len(suffixe) >= 4:
+            return token[:-len(suffixe)]
+    return token
+
+def distance_edition_max(longueur: int) -> int:
+    """Distance d'édition tolérée pour un token de cette longueur (0 : correspondance exacte seule)"""
+    if longueur < LONGUEUR_MIN_CORRECTION:
+        return 0
+    return 2 if longueur >= LONGUEUR_MIN_DISTANCE_2 else 1
+
+def _suppressions(token: str, distance: int) -> set:
+    """Voisinage par suppression de SymSpell : le token et toutes ses variantes à ≤ distance suppressions"""
+    variantes = {token}
+    frontiere = {token}
+    for _ in range(distance):
+        frontiere = {v[:i] + v[i + 1:] for v in frontiere for i in range(len(v))}
+        variantes |= frontiere
+    return variantes
+
+def distance_damerau_levenshtein(a: str, b: str) -> int:
+    """Distance d'édition avec transpositions adjacentes (variante « optimal string alignment »)"""
+    precedente_2, precedente = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        courante = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cout = 0 if a[i - 1] == b[j - 1] else 1
+            courante[j] = min(precedente[j] + 1, courante[j - 1] + 1, precedente[j - 1] + cout)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                courante[j] = min(courante[j], precedente_2[j - 2] + 1)
+        precedente_2, precedente = precedente, courante
+    return precedente[len(b)]
+
+class MoteurCorrespondance:
+    """Recherche de mots-clés sur les frontières de tokens, insensible à la casse et aux accents
+
+    Le texte est découpé en tokens (mots, plus les tokens spéciaux du vocabulaire comme 'c#',
+    'ci/cd' ou '.net'), chaque token replié est converti en identifiant entier, et les mots-clés,
+    y compris multi-mots, sont recherchés comme n-grammes d'identifiants en un seul passage.
+    'ia' ne correspond donc plus à l'intérieur de « social », ni 'go' dans « cargo ». Un pluriel
+    ou une flexion d'un token connu (« APIs », « développeurs ») reprend l'identifiant de ce token.
+
+    Les alias ({forme de surface: mot-clé canonique}) sont restitués sous leur forme canonique :
+    un alias d'un seul token partage directement l'identifiant du mot-clé canonique.
+
+    Un token absent du vocabulaire (« Kubernets », « Angluar ») est rapproché d'un token connu
+    par un index de suppressions SymSpell, puis vérifié en distance de Damerau-Levenshtein ;
+    le chemin exact, de loin le plus fréquent, ne coûte qu'une recherche dans un dictionnaire.
+    """
+
+    def __init__(self, mots_cles, alias: Optional[Dict[str, str]] = None, tolerance_fautes: bool = True,
+                 cibles_correction=None):
+        alias = alias or {}
+        # Tous les alias participent au découpage : 'node.js' reste un token même sans 'node' ici
+        speciaux = {
+            morceau.lower()
+            for mot_cle in list(mots_cles) + list(alias) for morceau in mot_cle.split()
+            if any(c in CARACTERES_TOKENS_SPECIAUX for c in morceau)
+        }
+        alias = {surface: canonique for surface, canonique in alias.items() if canonique in mots_cles}
+        motif = MOTIF_MOT
+        if speciaux:
+            alternatives = "|".join(re.escape(s) for s in sorted(speciaux, key=len, reverse=True))
+            motif = rf"(?<!\w)(?:{alternatives})(?!\w)|{motif}"
+        self._regex_tokens = re.compile(motif, re.IGNORECASE)
+
+        # Identifiant 0 réservé aux tokens hors vocabulaire : ils interrompent toute correspondance
+        self._vocabulaire = {}
+        motifs = defaultdict(list)
+        for mot_cle in mots_cles:
+            ids = tuple(
+                self._vocabulaire.setdefault(token, len(self._vocabulaire) + 1)
+                for token in self._tokens_normalises(mot_cle)
+            )
+            if ids:
+                motifs[ids].append(mot_cle)
+
+        for surface, canonique in alias.items():
+            tokens = self._tokens_normalises(surface)
+            ids_canonique = [self._vocabulaire[t] for t in self._tokens_normalises(canonique)]
+            if len(tokens) == 1 and len(ids_canonique) == 1 and tokens[0] not in self._vocabulaire:
+                self._vocabulaire[tokens[0]] = ids_canonique[0]
+            elif tokens:
+                ids = tuple(self._vocabulaire.setdefault(t, len(self._vocabulaire) + 1) for t in tokens)
+                if canonique not in motifs[ids]:
+                    motifs[ids].append(canonique)
+        # Valeur de l'automate : (mots-clés, motif d'un seul token) ; un motif d'un seul token court
+        # est validé par son contexte (_contexte_token_court)
+        self._automate = AutomateAhoCorasick({ids: (valeurs, len(ids) == 1) for ids, valeurs in motifs.items()})
+
+        self._index_suppressions = defaultdict(set)
+        self._corrections = CacheLRU(NB_CORRECTIONS_EN_CACHE)
+        # Radical -> {token connu: identifiant} : une flexion d'un token connu n'est pas une faute,
+        # elle est ramenée à ce token (« pipelines » → 'pipeline') ou écartée (« développer »)
+        self._radicaux_vocabulaire = defaultdict(dict)
+        for token, identifiant in self._vocabulaire.items():
+            self._radicaux_vocabulaire[_radical(token)][token] = identifiant
+        if tolerance_fautes:
+            # Seuls les tokens des mots-clés cibles (compétences) peuvent être le résultat d'une correction
+            cibles = (self._vocabulaire if cibles_correction is None
+                      else {t for mot_cle in cibles_correction for t in self._tokens_normalises(mot_cle)})
+            for token in cibles:
+                distance = distance_edition_max(len(token))
+                if distance and token.isalpha() and token in self._vocabulaire:
+                    for variante in _suppressions(token, distance):
+                        self._index_suppressions[variante].add(token)
+
+    def identifiant_flexion(self, token: str) -> int:
+        """Identifiant du token connu dont un token normalisé est une flexion, 0 si aucun
+
+        Le token doit partager le radical d'un token connu et s'y ramener par le pluriel
+        (« frameworks » → 'framework') ou par un suffixe de flexion (« testing » → 'test') :
+        « développement » n'est pas une flexion de 'développeur'.
+        """
+        radical = _radical(token)
+        formes = self._radicaux_vocabulaire.get(radical)
+        if not formes:
+            return 0
+        return formes.get(_singulier(token)) or formes.get(radical) or 0
+
+    def corriger_token(self, token: str) -> int:
+        """Identifiant du token connu le plus proche d'un token normalisé inconnu, 0 si aucun
+
+        Une flexion d'un token connu est ramenée à ce token. Un rapprochement ambigu (plusieurs
+        tokens à la même distance) est écarté, de même qu'un mot courant du lexique, un dérivé
+        d'un token connu ou une correction trop peu similaire.
+        """
+        if not self._index_suppressions or len(token) < LONGUEUR_MIN_CORRECTION - 1 or not token.isalpha():
+            return 0
+        identifiant = self._corrections.obtenir(token)
+        if identifiant is not None:
+            return identifiant
+        identifiant = self.identifiant_flexion(token)
+        if identifiant or token in MOTS_COURANTS or _radical(token) in self._radicaux_vocabulaire:
+            self._corrections.enregistrer(token, identifiant)
+            return identifiant
+
+        candidats = set()
+        # +1 : un token amputé d'une lettre peut corriger un mot-clé de la longueur supérieure
+        for variante in _suppressions(token, distance_edition_max(len(token) + 1)):
+            candidats |= self._index_suppressions.get(variante, set())
+
+        meilleure_distance, meilleurs = None, []
+        for candidat in candidats:
+            if abs(len(candidat) - len(token)) > distance_edition_max(len(candidat)):
+                continue
+            distance = distance_damerau_levenshtein(token, candidat)
+            if (distance > distance_edition_max(len(candidat))
+                    or 1 - distance / max(len(token), len(candidat)) < SIMILARITE_MIN_CORRECTION):
+                continue
+            if meilleure_distance is None or distance < meilleure_distance:
+                meilleure_distance, meilleurs = distance, [candidat]
+            elif distance == meilleure_distance:
+                meilleurs.append(candidat)
+
+        identifiant = self._vocabulaire[meilleurs[0]] if len(meilleurs) == 1 else 0
+        self._corrections.enregistrer(token, identifiant)
+        return identifiant
+
+    def _tokens_normalises(self, texte: str) -> List[str]:
+        return [normaliser_token(t) for t in self._regex_tokens.findall(texte)]
+
+    def tokeniser(self, texte: str) -> Tuple[array, List[int]]:
+        """Retourne (identifiants des tokens, position de début de chaque token dans texte)"""
+        vocabulaire = self._vocabulaire
+        debuts = []
+        ids = array('I')
+        for correspondance in self._regex_tokens.finditer(texte):
+            surface = correspondance.group()
+            token = normaliser_token(surface)
+            identifiant = vocabulaire.get(token)
+            if identifiant is None:
+                # Pluriels et flexions (« APIs », « frameworks ») avant toute correction de faute
+                identifiant = self.identifiant_flexion(token)
+                if identifiant and len(token) <= LONGUEUR_MAX_FLEXION_COURTE and surface.islower():
+                    identifiant = 0
+                identifiant = identifiant or self.corriger_token(token)
+            ids.append(identifiant)
+            debuts.append(correspondance.start())
+        return ids, debuts
+
+    def _contexte_token_court(self, texte: str, ids: array, debuts: List[int], indice: int) -> bool:
+        """Vrai si un mot-clé d'une ou deux lettres trouvé seul est plausible dans son contexte"""
+        debut = debuts[indice]
+        fin = self._regex_tokens.match(texte, debut).end()
+        if fin - debut > LONGUEUR_MAX_TOKEN_COURT:
+            return True
+        if ((debut and texte[debut - 1] in CARACTERES_COMPOSES)
+                or (fin < len(texte) and texte[fin] in CARACTERES_COMPOSES)
+                or texte[max(debut - 2, 0):debut].lower() in ELISIONS_VERBALES):
+            return False
+        if not texte[debut:fin].islower():
+            return True
+        # En minuscules : seulement entouré d'autres tokens du vocabulaire (« python, go, docker »)
+        return (indice > 0 and ids[indice - 1] != 0) or (indice + 1 < len(ids) and ids[indice + 1] != 0)
+
+    def rechercher(self, texte: str) -> Dict[str, List[int]]:
+        """Retourne {mot_clé: [positions dans texte]} pour tous les mots-clés présents"""
+        ids, debuts = self.tokeniser(texte)
+        positions = defaultdict(list)
+        for indice_token, (mots_cles, token_seul) in self._automate.rechercher(ids):
+            if token_seul and not self._contexte_token_court(texte, ids, debuts, indice_token):
+                continue
+            for mot_cle in mots_cles:
+                positions[mot_cle].append(debuts[indice_token])
+        return dict(positions)
+
+# === TAXONOMIE DES COMPÉTENCES ===
+# Domaines, mots-clés et catégories de connaissances : fichier de données versionné, rechargé à chaud
+CHEMIN_TAXONOMIE = os.environ.get(
+    "COMAI_TAXONOMIE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "taxonomie_competences.json")
+)
+INTERVALLE_VERIFICATION_TAXONOMIE_S = 2.0
+# Saturation BM25 de la fréquence d'un mot-clé : la 5e occurrence pèse moins que la 2e
+BM25_K1 = 1.2
+
+def _figer(valeur):
+    """Copie en lecture seule : dictionnaires en MappingProxyType, listes en tuples"""
+    if isinstance(valeur, dict):
+        return MappingProxyType({cle: _figer(v) for cle, v in valeur.items()})
+    if isinstance(valeur, list):
+        return tuple(_figer(v) for v in valeur)
+    return valeur
+
+def cle_surface(terme: str) -> str:
+    """Clé de recherche d'une forme de surface : tokens repliés séparés par une espace"""
+    return " ".join(normaliser_token(t) for t in terme.split())
+
+def _resoudre_alias(graphe: Dict[str, List[str]]) -> Dict[str, str]:
+    """Aplatit le graphe {canonique: [alias, ...]} en {forme de surface: canonique racine}
+
+    Les chaînes (kube → k8s → kubernetes) sont suivies jusqu'à la racine ; un cycle est une erreur.
+    """
+    parent = {}
+    for canonique, surfaces in graphe.items():
+        for surface in surfaces:
+            cle = cle_surface(surface)
+            if cle != cle_surface(canonique):
+                parent[cle] = canonique
+
+    table = {}
+    for cle in parent:
+        vus = {cle}
+        racine = parent[cle]
+        while cle_surface(racine) in parent:
+            if cle_surface(racine) in vus:
+                raise ValueError(f"Cycle dans les alias de compétences autour de '{racine}'")
+            vus.add(cle_surface(racine))
+            racine = parent[cle_surface(racine)]
+        table[cle] = racine
+    return table
+
+class TaxonomieCompilee:
+    """Instantané immuable de la taxonomie : tables, moteurs de correspondance et matrice TF-IDF
+
+    Construit une fois par contenu du fichier puis jamais modifié : une analyse en cours
+    conserve l'instantané qu'elle a obtenu, même si le fichier est rechargé entre-temps.
+    """
+
+    def __init__(self, donnees: Dict[str, Any], empreinte: str):
+        self.version = donnees.get('version', 0)
+        self.empreinte = empreinte
+
+        # Graphe d'alias aplati : une seule recherche de la forme de surface donne le mot-clé canonique
+        self.alias = _figer(_resoudre_alias(donnees.get('alias', {})))
+
+        # Variantes d'orthographe ramenées à leur forme canonique dans toutes les listes
+        domaines = donnees['domaines']
+        self.domaines_mots_cles = _figer({
+            d: self._canoniser_liste(v.get('mots_cles', [])) for d, v in domaines.items()
+        })
+        self.categories_par_domaine = _figer({
+            d: {categorie: self._canoniser_liste(mots_cles) for categorie, mots_cles in v['categories'].items()}
+            for d, v in domaines.items() if v.get('categories')
+        })
+
+        domaines_par_mot_cle = defaultdict(list)
+        for domaine, mots_cles in self.domaines_mots_cles.items():
+            for mot_cle in mots_cles:
+                domaines_par_mot_cle[mot_cle].append(domaine)
+        self.domaines_par_mot_cle = _figer(dict(domaines_par_mot_cle))
+
+        mots_cles_competences = dict.fromkeys(
+            mot_cle
+            for categories in self.categories_par_domaine.values()
+            for mots_cles in categories.values()
+            for mot_cle in mots_cles
+        )
+        self.mots_cles_competences = frozenset(mots_cles_competences)
+
+        # Mots-clés de domaines et de compétences dans un seul moteur : un seul passage par texte
+        # Les fautes de frappe ne sont corrigées que vers des compétences : les mots-clés de domaine
+        # sont souvent des mots courants (« governance », « quality ») proches du vocabulaire français
+        self.moteur = MoteurCorrespondance(list(dict.fromkeys([*self.domaines_par_mot_cle, *mots_cles_competences])),
+                                           self.alias, cibles_correction=self.mots_cles_competences)
+
+        self._colonnes, self._idf, self._matrice_domaines = self._construire_matrice_domaines()
+
+    def canonique(self, terme: str) -> str:
+        """Forme canonique d'une compétence (le terme lui-même s'il n'est l'alias de rien)"""
+        return self.alias.get(cle_surface(terme), terme)
+
+    def _canoniser_liste(self, mots_cles: List[str]) -> List[str]:
+        return list(dict.fromkeys(self.canonique(mot_cle) for mot_cle in mots_cles))
+
+    def _construire_matrice_domaines(self):
+        """Matrice creuse domaines × mots-clés, pondérée par l'IDF et normalisée L2 par domaine
+
+        L'IDF pénalise les mots-clés partagés par plusieurs domaines ; la normalisation évite
+        de favoriser les domaines dont la liste de mots-clés est la plus longue.
+        """
+        colonnes = {mot_cle: indice for indice, mot_cle in enumerate(self.domaines_par_mot_cle)}
+        lignes_domaines = {domaine: indice for indice, domaine in enumerate(self.domaines_mots_cles)}
+        nb_domaines = len(self.domaines_mots_cles)
+        idf = np.array([
+            np.log1p(nb_domaines / len(self.domaines_par_mot_cle[mot_cle])) for mot_cle in colonnes
+        ])
+
+        lignes, cols = [], []
+        for mot_cle, colonne in colonnes.items():
+            for domaine in self.domaines_par_mot_cle[mot_cle]:
+                lignes.append(lignes_domaines[domaine])
+                cols.append(colonne)
+        matrice = sparse.csr_matrix((idf[cols], (lignes, cols)), shape=(nb_domaines, len(colonnes)))
+        return colonnes, idf, _normaliser_lignes(matrice)
+
+    def vectoriser_correspondances(self, liste_correspondances: List[Dict[str, List[int]]]) -> sparse.csr_matrix:
+        """Une ligne TF-IDF normalisée par document, à partir des correspondances {mot_clé: positions}"""
+        indptr, indices, donnees = [0], [], []
+        for correspondances in liste_correspondances:
+            for mot_cle, positions in correspondances.items():
+                colonne = self._colonnes.get(mot_cle)
+                if colonne is not None:
+                    indices.append(colonne)
+                    donnees.append(len(positions))
+            indptr.append(len(indices))
+
+        tf = np.asarray(donnees, dtype=float)
+        poids = tf * (BM25_K1 + 1) / (tf + BM25_K1) * self._idf[indices]
+        matrice = sparse.csr_matrix((poids, indices, indptr),
+                                    shape=(len(liste_correspondances), len(self._colonnes)))
+        return _normaliser_lignes(matrice)
+
+    def scorer_domaines_lot(self, textes_missions: List[str]) -> np.ndarray:
+        """Similarité cosinus de chaque mission avec chaque domaine, en un seul produit matriciel"""
+        documents = self.vectoriser_correspondances([self.moteur.rechercher(t) for t in textes_missions])
+        return (documents @ self._matrice_domaines.T).toarray()
+
+    def classer_domaines(self, similarites: np.ndarray) -> List[Tuple[str, float]]:
+        """Distribution complète des domaines, du plus pertinent au moins pertinent"""
+        noms = list(self.domaines_mots_cles)
+        # Tri stable : les ex aequo restent dans l'ordre de la table des domaines
+        ordre = np.argsort(-similarites, kind='stable')
+        return [(noms[i], float(similarites[i])) for i in ordre]
+
+    def scorer_domaines_mission(self, texte_mission: str) -> Dict[str, Dict[str, Any]]:
+        """Scores par domaine de la mission, triés par pertinence (voir scorer_domaines_mission)"""
+        return self.scorer_correspondances(self.moteur.rechercher(texte_mission))
+
+    def scorer_correspondances(self, positions: Dict[str, List[int]]) -> Dict[str, Dict[str, Any]]:
+        """Scores par domaine à partir des correspondances {mot_clé: positions} d'un passage existant"""
+        resultats = {}
+        for mot_cle, debuts in positions.items():
+            for domaine in self.domaines_par_mot_cle.get(mot_cle, ()):
+                resultat = resultats.setdefault(domaine, {'score': 0, 'occurrences': 0, 'correspondances': {}})
+                resultat['score'] += 1
+                resultat['occurrences'] += len(debuts)
+                resultat['correspondances'][mot_cle] = debuts
+
+        similarites = (self.vectoriser_correspondances([positions]) @ self._matrice_domaines.T).toarray()[0]
+        classement = {}
+        for domaine, pertinence in self.classer_domaines(similarites):
+            if domaine in resultats:
+                classement[domaine] = {'pertinence': pertinence, **resultats[domaine]}
+        return classement
+
+    def categories_depuis_scan(self, scan: Dict[str, List[int]], domaine: str) -> Dict[str, list]:
+        """Répartition par catégorie des mots-clés d'un domaine, à partir d'un scan existant"""
+        categories_trouvees = {}
+        for categorie, keywords in self.categories_par_domaine[domaine].items():
+            mots_trouves = [keyword for keyword in keywords if keyword in scan]
+            if mots_trouves:
+                categories_trouvees[categorie] = mots_trouves
+        return categories_trouvees
+
+def _normaliser_lignes(matrice: sparse.csr_matrix) -> sparse.csr_matrix:
+    normes = np.sqrt(np.asarray(matrice.multiply(matrice).sum(axis=1)).ravel())
+    return (sparse.diags(1 / np.maximum(normes, 1e-12)) @ matrice).tocsr()
+
+def compiler_taxonomie(chemin: str) -> TaxonomieCompilee:
+    """Lit le fichier de taxonomie et compile un nouvel instantané"""
+    with open(chemin, 'rb') as f:
+        contenu = f.read()
+    donnees = json.loads(contenu.decode('utf-8'))
+    return TaxonomieCompilee(donnees, hashlib.sha256(contenu).hexdigest()[:16])
+
+_verrou_taxonomie = threading.Lock()
+_etat_taxonomie = {'instantane': None, 'mtime': None, 'verifie_a': 0.0, 'erreur': None}
+compteurs_taxonomie = Counter()
+journal_taxonomie = logging.getLogger(__name__ + ".taxonomie")
+
+def obtenir_taxonomie() -> TaxonomieCompilee:
+    """Instantané courant de la taxonomie, recompilé si le fichier a changé depuis le dernier contrôle
+
+    Le remplacement est une simple affectation de référence : les appelants qui détiennent
+    l'ancien instantané continuent de l'utiliser sans verrou. Un fichier invalide est journalisé
+    et l'instantané précédent est conservé ; l'application affiche l'erreur via
+    erreur_rechargement_taxonomie (ce chargeur s'exécute aussi hors contexte Streamlit).
+    """
+    etat = _etat_taxonomie
+    if etat['instantane'] is not None and time.monotonic() - etat['verifie_a'] < INTERVALLE_VERIFICATION_TAXONOMIE_S:
+        return etat['instantane']
+
+    with _verrou_taxonomie:
+        if etat['instantane'] is not None and time.monotonic() - etat['verifie_a'] < INTERVALLE_VERIFICATION_TAXONOMIE_S:
+            return etat['instantane']
+
+        mtime = None
+        try:
+            mtime = os.stat(CHEMIN_TAXONOMIE).st_mtime_ns
+            if mtime != etat['mtime']:
+                instantane = compiler_taxonomie(CHEMIN_TAXONOMIE)
+                etat['instantane'] = instantane
+                etat['erreur'] = None
+                compteurs_taxonomie['chargements'] += 1
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            if etat['instantane'] is None:
+                raise
+            compteurs_taxonomie['erreurs'] += 1
+            etat['erreur'] = f"Taxonomie non rechargée, version {etat['instantane'].version} conservée : {e}"
+            journal_taxonomie.warning(etat['erreur'])
+        # Un fichier invalide n'est pas relu tant qu'il n'a pas été modifié à nouveau
+        etat['mtime'] = mtime if mtime is not None else etat['mtime']
+        etat['verifie_a'] = time.monotonic()
+        return etat['instantane']
+
+def erreur_rechargement_taxonomie() -> Optional[str]:
+    """Message du dernier rechargement de taxonomie en échec, None si l'instantané courant est à jour"""
+    return _etat_taxonomie['erreur']
+
+# Compilation au démarrage : une taxonomie absente ou invalide empêche le chargement du module
+obtenir_taxonomie()
+
+# === DÉTECTION DU DOMAINE ET DES COMPÉTENCES ===
+
+def scorer_domaines_mission(texte_mission: str) -> Dict[str, Dict[str, Any]]:
+    """Score tous les domaines en un seul passage linéaire sur le texte de la mission
+
+    Retourne, pour chaque domaine ayant au moins un mot-clé présent, trié par pertinence :
+    {'pertinence': similarité cosinus TF-IDF avec le domaine, 'score': nb de mots-clés distincts
+     trouvés, 'occurrences': nb total de correspondances,
+     'correspondances': {mot_clé: [positions dans texte_mission]}}
+    """
+    return obtenir_taxonomie().scorer_domaines_mission(texte_mission)
+
+def scorer_domaines_lot(textes_missions: List[str]) -> np.ndarray:
+    """Similarité cosinus de chaque mission avec chaque domaine, en un seul produit matriciel
+
+    Retourne une matrice (nb missions × nb domaines), colonnes dans l'ordre de la taxonomie.
+    """
+    return obtenir_taxonomie().scorer_domaines_lot(textes_missions)
+
+def domaine_principal(scores: Dict[str, Dict[str, Any]]) -> str:
+    """Domaine le plus pertinent parmi ceux retournés par scorer_domaines_mission"""
     if scores:
-        return max(scores.items(), key=lambda x: x[1])[0]
+        return next(iter(scores))
     
     return 'Général'
 
+# Une mission est hybride quand un autre domaine atteint cette fraction de la pertinence du premier
+SEUIL_RELATIF_MULTI_DOMAINES = 0.6
+PERTINENCE_MIN_DOMAINE = 0.05
+NB_MAX_DOMAINES = 3
+
+def selectionner_domaines(scores: Dict[str, Dict[str, Any]]) -> List[Tuple[str, float]]:
+    """Domaines retenus pour la mission, avec leur poids relatif (somme des poids = 1)
+
+    Le domaine principal est toujours retenu ; les suivants le sont s'ils dépassent le seuil
+    relatif, ce qui couvre les missions hybrides (ex : DevSecOps = DevOps + Cybersécurité).
+    """
+    if not scores:
+        return []
+
+    pertinences = [(domaine, score['pertinence']) for domaine, score in scores.items()]
+    seuil = max(pertinences[0][1] * SEUIL_RELATIF_MULTI_DOMAINES, PERTINENCE_MIN_DOMAINE)
+    retenus = pertinences[:1] + [(d, p) for d, p in pertinences[1:] if p >= seuil]
+    retenus = retenus[:NB_MAX_DOMAINES]
+
+    total = sum(p for _, p in retenus) or 1
+    return [(domaine, pertinence / total) for domaine, pertinence in retenus]
+
+def detecter_domaine_mission(texte_mission: str) -> str:
+    """Détecte le domaine d'activité principal ET la spécialisation de la mission"""
+    return analyser_mission(texte_mission).domaine
+
+def scanner_competences(texte_cv: str) -> Dict[str, List[int]]:
+    """Repère en un seul passage tous les mots-clés de compétences, tous domaines confondus
+
+    Retourne {mot_clé: [positions dans texte_cv]}, lu depuis l'analyse mémorisée du CV.
+    """
+    return analyser_cv(texte_cv).scan
+
+def canoniser_competence(terme: str) -> str:
+    """Forme canonique d'une compétence selon le graphe d'alias (ex : 'K8S' → 'kubernetes')"""
+    return obtenir_taxonomie().canonique(terme)
+
 def extraire_categories_connaissances_par_domaine(texte_cv: str, domaine: str) -> Dict[str, list]:
     """Extrait et suggère des catégories de connaissances selon le domaine spécialisé"""
-    categories_par_domaine = {
-        'Développement & Programmation': {
-            'Langages de programmation': ['python', 'java', 'javascript', 'c#', 'php', 'ruby', 'go', 'rust', 'kotlin'],
-            'Frameworks': ['react', 'angular', 'vue', 'django', 'flask', 'spring', 'laravel', 'express'],
-            'Bases de données': ['mysql', 'postgresql', 'mongodb', 'oracle', 'redis', 'elasticsearch'],
-            'APIs & Services': ['rest', 'graphql', 'soap', 'microservices', 'api design', 'webhook'],
-            'Outils de développement': ['git', 'github', 'vscode', 'intellij', 'postman', 'swagger'],
-            'Méthodologies de dev': ['agile', 'scrum', 'kanban', 'tdd', 'bdd', 'code review']
-        },
-        'DevOps & Infrastructure': {
-            'Outils DevOps': ['jenkins', 'gitlab ci', 'github actions', 'ansible', 'puppet', 'chef'],
-            'Cloud Computing': ['aws', 'azure', 'gcp', 'serverless', 'lambda', 'cloud formation'],
-            'Conteneurisation': ['docker', 'kubernetes', 'openshift', 'helm', 'docker compose'],
-            'CI/CD': ['continuous integration', 'continuous deployment', 'pipeline', 'automation'],
-            'Monitoring': ['prometheus', 'grafana', 'elk stack', 'nagios', 'datadog'],
-            'Infrastructure as Code': ['terraform', 'cloudformation', 'arm templates', 'pulumi']
-        },
-        'Cybersécurité': {
-            'Technologie': ['firewall', 'ids', 'ips', 'siem', 'soar', 'edr', 'antivirus', 'proxy'],
-            'Normes et standards': ['iso 27001', 'iso 27002', 'nist', 'cis controls', 'pci dss', 'anssi'],
-            'Réglementations': ['gdpr', 'rgpd', 'sox', 'hipaa', 'nis', 'lpm', 'dora'],
-            'Outils / IDE': ['nessus', 'qualys', 'burp suite', 'metasploit', 'nmap', 'wireshark', 'kali linux'],
-            'Gestion de projet': ['prince2', 'pmp', 'agile', 'scrum', 'itil', 'cobit'],
-            'Langages': ['python', 'powershell', 'bash', 'sql', 'javascript', 'c++', 'java'],
-            'Réseaux': ['tcp/ip', 'vpn', 'vlan', 'routing', 'switching', 'dns', 'dhcp'],
-            'Systèmes d\'exploitation': ['windows', 'linux', 'unix', 'macos', 'active directory']
-        },
-        'Intelligence Artificielle & Data': {
-            'Machine Learning': ['supervised learning', 'unsupervised learning', 'deep learning', 'nlp'],
-            'Frameworks IA': ['tensorflow', 'pytorch', 'scikit-learn', 'keras', 'hugging face'],
-            'Data Engineering': ['spark', 'hadoop', 'kafka', 'airflow', 'etl', 'data pipeline'],
-            'Analyse de données': ['pandas', 'numpy', 'scipy', 'statistical analysis', 'data mining'],
-            'Outils IA': ['jupyter', 'google colab', 'mlflow', 'kubeflow', 'azure ml'],
-            'Visualisation de données': ['matplotlib', 'seaborn', 'plotly', 'tableau', 'd3.js']
-        },
-        'Business Intelligence & Analytics': {
-            'Outils BI': ['power bi', 'tableau', 'qlik sense', 'looker', 'cognos'],
-            'Reporting': ['ssrs', 'crystal reports', 'dashboard design', 'kpi monitoring'],
-            'Data Warehousing': ['dimensional modeling', 'etl', 'olap', 'data mart'],
-            'Visualisation': ['data visualization', 'storytelling', 'infographic', 'charts'],
-            'ETL': ['ssis', 'talend', 'informatica', 'pentaho', 'data integration'],
-            'Analyse prédictive': ['forecasting', 'trend analysis', 'predictive modeling']
-        },
-        'Architecture & Systèmes': {
-            'Architecture logicielle': ['design patterns', 'solid principles', 'clean architecture'],
-            'Systèmes distribués': ['microservices', 'event driven', 'cqrs', 'event sourcing'],
-            'Microservices': ['api gateway', 'service mesh', 'circuit breaker', 'saga pattern'],
-            'Patterns de conception': ['mvc', 'mvp', 'observer', 'factory', 'singleton'],
-            'Performance': ['optimization', 'caching', 'load balancing', 'scalability'],
-            'Scalabilité': ['horizontal scaling', 'vertical scaling', 'auto scaling']
-        },
-        'Marketing Digital': {
-            'Outils marketing': ['hubspot', 'marketo', 'mailchimp', 'pardot', 'eloqua'],
-            'Analytics': ['google analytics', 'adobe analytics', 'tag manager', 'heat mapping'],
-            'Réseaux sociaux': ['facebook ads', 'google ads', 'linkedin ads', 'twitter ads'],
-            'CRM': ['salesforce', 'hubspot', 'pipedrive', 'zoho', 'dynamics'],
-            'Design graphique': ['photoshop', 'illustrator', 'canva', 'figma', 'sketch'],
-            'SEO/SEM': ['seo', 'sem', 'content marketing', 'keyword research', 'link building']
-        },
-        'Finance': {
-            'Logiciels financiers': ['sap', 'oracle financials', 'sage', 'cegid', 'blackline'],
-            'Réglementation': ['ifrs', 'pcg', 'sox', 'bâle', 'mifid', 'aml'],
-            'Analyse de données': ['excel avancé', 'power bi', 'tableau', 'r', 'python finance'],
-            'Reporting': ['consolidation', 'business intelligence', 'financial reporting'],
-            'Certification': ['cpa', 'cfa', 'frm', 'acca', 'dscg'],
-            'Risk Management': ['credit risk', 'market risk', 'operational risk', 'compliance']
-        },
-        'Ressources Humaines': {
-            'SIRH': ['sap hr', 'workday', 'adp', 'talentsoft', 'cornerstone'],
-            'Recrutement': ['ats', 'linkedin recruiter', 'sourcing', 'talent acquisition'],
-            'Formation': ['lms', 'e-learning', 'moodle', 'learning management', 'coaching'],
-            'Paie': ['sage paie', 'adp', 'ceridian', 'payroll management'],
-            'Droit social': ['droit travail', 'convention collective', 'relations sociales'],
-            'Talent Management': ['performance management', 'succession planning', 'career development']
-        },
-        'Logistique & Supply Chain': {
-            'Supply Chain': ['supply chain management', 'demand planning', 'procurement'],
-            'Systèmes WMS': ['wms', 'sap wm', 'manhattan', 'warehouse management'],
-            'Transport': ['tms', 'fleet management', 'logistics optimization'],
-            'Réglementation': ['customs', 'trade compliance', 'incoterms'],
-            'Optimisation': ['lean', 'six sigma', 'process improvement', 'inventory optimization'],
-            'Procurement': ['sourcing', 'vendor management', 'contract negotiation']
-        },
-        'Consulting & Stratégie': {
-            'Méthodologies conseil': ['mckinsey method', 'bcg matrix', 'lean startup', 'design thinking'],
-            'Analyse stratégique': ['swot', 'porter five forces', 'value chain analysis'],
-            'Conduite du changement': ['change management', 'kotter', 'organizational development'],
-            'Gestion de projet': ['pmp', 'prince2', 'agile project management', 'scrum master'],
-            'Secteurs d\'expertise': ['industry knowledge', 'domain expertise', 'market analysis'],
-            'Outils d\'analyse': ['excel', 'powerpoint', 'tableau', 'power bi', 'miro']
-        },
-        'Santé & Médical': {
-            'Systèmes médicaux': ['his', 'emr', 'ehr', 'pacs', 'ris', 'clinical systems'],
-            'Réglementation santé': ['fda', 'ce marking', 'iso 13485', 'hipaa', 'gdpr santé'],
-            'Dispositifs médicaux': ['medical devices', 'implants', 'diagnostic equipment'],
-            'Informatique médicale': ['health informatics', 'telemedicine', 'mhealth'],
-            'Qualité santé': ['gmp', 'gcp', 'quality assurance', 'risk management'],
-            'Recherche clinique': ['clinical trials', 'biostatistics', 'regulatory affairs']
-        },
-        'Éducation & Formation': {
-            'Pédagogie': ['pedagogical methods', 'learning theories', 'curriculum design'],
-            'Outils e-learning': ['moodle', 'blackboard', 'canvas', 'articulate', 'captivate'],
-            'Conception pédagogique': ['instructional design', 'learning objectives', 'assessment'],
-            'Évaluation': ['evaluation methods', 'learning analytics', 'competency assessment'],
-            'Technologies éducatives': ['edtech', 'virtual classroom', 'gamification'],
-            'Ingénierie de formation': ['training needs analysis', 'learning path design']
-        },
-        'Juridique & Compliance': {
-            'Droit des affaires': ['corporate law', 'contract law', 'commercial law'],
-            'Compliance': ['regulatory compliance', 'internal controls', 'policy development'],
-            'Réglementation': ['gdpr', 'sox', 'anti money laundering', 'trade sanctions'],
-            'Contentieux': ['litigation', 'dispute resolution', 'arbitration'],
-            'Propriété intellectuelle': ['intellectual property', 'patents', 'trademarks'],
-            'Outils juridiques': ['legal research', 'case management', 'contract management']
-        }
-    }
-    
-    if domaine not in categories_par_domaine:
-        return {
-            'Outils et Logiciels': [],
-            'Compétences Techniques': [],
-            'Méthodologies': []
-        }
-    
-    texte_lower = texte_cv.lower()
-    categories_trouvees = {}
-    
-    for categorie, keywords in categories_par_domaine[domaine].items():
-        mots_trouves = [keyword for keyword in keywords if keyword in texte_lower]
-        if mots_trouves:
-            categories_trouvees[categorie] = mots_trouves
-    
-    return categories_trouvees
+    return analyser_cv(texte_cv).categories(domaine)
+
+def extraire_categories_connaissances_multi_domaines(texte_cv: str, domaines: List[str]) -> Dict[str, list]:
+    """Extrait les catégories de connaissances de tous les domaines d'une mission hybride"""
+    return analyser_cv(texte_cv).categories_domaines(domaines)
+
+# === ANALYSES MÉMORISÉES ===
+NB_ANALYSES_EN_CACHE = 32
+_analyses = CacheLRU(NB_ANALYSES_EN_CACHE)
+compteurs_analyses = Counter()
+
+@dataclass(frozen=True)
+class AnalyseMission:
+    """Résultat unique de l'analyse d'une mission : scores par domaine et domaine principal"""
+    empreinte: str
+    scores_domaines: Dict[str, Dict[str, Any]]
+    domaine: str
+    domaines: List[Tuple[str, float]]
+    # {compétence: {'positions': [...], 'exigence': 'obligatoire' | 'standard' | 'souhaitée'}}
+    competences: Dict[str, Dict[str, Any]]
+    taxonomie: TaxonomieCompilee = field(compare=False, repr=False)
+
+    @property
+    def classement(self) -> List[Tuple[str, float]]:
+        """Distribution complète des domaines par pertinence décroissante (domaines absents à 0)"""
+        presents = [(d, score['pertinence']) for d, score in self.scores_domaines.items()]
+        absents = [(d, 0.0) for d in self.taxonomie.domaines_mots_cles if d not in self.scores_domaines]
+        return presents + absents
+
+@dataclass(frozen=True)
+class AnalyseCv:
+    """Résultat unique de l'analyse d'un dossier : mots-clés de compétences et leurs positions"""
+    empreinte: str
+    scan: Dict[str, List[int]]
+    # Repères de dates [(position, année)], triés par position
+    annees: List[Tuple[int, int]]
+    taxonomie: TaxonomieCompilee = field(compare=False, repr=False)
+
+    def categories(self, domaine: str) -> Dict[str, list]:
+        """Catégories de compétences du domaine présentes dans le dossier"""
+        if domaine not in self.taxonomie.categories_par_domaine:
+            return {
+                'Outils et Logiciels': [],
+                'Compétences Techniques': [],
+                'Méthodologies': []
+            }
+        return self.taxonomie.categories_depuis_scan(self.scan, domaine)
+
+    def categories_domaines(self, domaines: List[str]) -> Dict[str, list]:
+        """Union des catégories de plusieurs domaines, lue sur le même scan"""
+        if len(domaines) <= 1:
+            return self.categories(domaines[0] if domaines else 'Général')
+
+        union = {}
+        for domaine in domaines:
+            for categorie, mots_trouves in self.categories(domaine).items():
+                deja_vus = union.setdefault(categorie, [])
+                deja_vus.extend(mot for mot in mots_trouves if mot not in deja_vus)
+        return union
+
+def _cle_analyse(type_analyse: str, texte: str, taxonomie: TaxonomieCompilee) -> Tuple[str, str]:
+    empreinte = hashlib.sha256(texte.encode('utf-8')).hexdigest()
+    return empreinte, f"{type_analyse}-{taxonomie.empreinte}-{empreinte}"
+
+def analyser_mission(texte_mission: str, taxonomie: Optional[TaxonomieCompilee] = None) -> AnalyseMission:
+    """Analyse la mission une seule fois par (empreinte du texte, empreinte de la taxonomie)"""
+    taxonomie = taxonomie or obtenir_taxonomie()
+    empreinte, cle = _cle_analyse('mission', texte_mission, taxonomie)
+    analyse = _analyses.obtenir(cle)
+    if analyse is not None:
+        compteurs_analyses['hits'] += 1
+        return analyse
+
+    compteurs_analyses['scans_mission'] += 1
+    positions = taxonomie.moteur.rechercher(texte_mission)
+    scores = taxonomie.scorer_correspondances(positions)
+    competences = {mot_cle: debuts for mot_cle, debuts in positions.items()
+                   if mot_cle in taxonomie.mots_cles_competences}
+    exigences = niveaux_exigence(texte_mission, competences)
+    analyse = AnalyseMission(
+        empreinte=empreinte, scores_domaines=scores, domaine=domaine_principal(scores),
+        domaines=selectionner_domaines(scores), taxonomie=taxonomie,
+        competences={mot_cle: {'positions': debuts, 'exigence': exigences[mot_cle]}
+                     for mot_cle, debuts in competences.items()},
+    )
+    _analyses.enregistrer(cle, analyse)
+    return analyse
+
+def analyser_cv(texte_cv: str, taxonomie: Optional[TaxonomieCompilee] = None) -> AnalyseCv:
+    """Analyse le dossier une seule fois par (empreinte du texte, empreinte de la taxonomie)"""
+    taxonomie = taxonomie or obtenir_taxonomie()
+    empreinte, cle = _cle_analyse('cv', texte_cv, taxonomie)
+    analyse = _analyses.obtenir(cle)
+    if analyse is not None:
+        compteurs_analyses['hits'] += 1
+        return analyse
+
+    compteurs_analyses['scans_cv'] += 1
+    analyse = AnalyseCv(empreinte=empreinte, scan=taxonomie.moteur.rechercher(texte_cv),
+                        annees=reperer_annees(texte_cv), taxonomie=taxonomie)
+    _analyses.enregistrer(cle, analyse)
+    return analyse
+
+# === SCORE D'ADÉQUATION PONDÉRÉ ===
+POIDS_EXIGENCE = {'obligatoire': 1.5, 'standard': 1.0, 'souhaitée': 0.5}
+# Indices cherchés dans le texte replié (minuscules, sans accents) de la phrase ou de l'intitulé de liste
+INDICES_SOUHAITEE = re.compile(
+    r"un plus|serait un atout|\batouts?\b|\bapprecie|\bsouhait|\bideal|\bbonus\b|\boptionnel|"
+    r"nice to have|is a plus|\bpreferred\b|\bpreferable\b"
+)
+INDICES_OBLIGATOIRE = re.compile(
+    r"\bobligatoire|\brequis|\bindispensable|\bimperati|\bexige|\bmaitrise|\bmust\b|\brequired\b|\bmandatory\b"
+)
+DELIMITEURS_PHRASE = re.compile(r"[.;!?•]")
+
+MOTIF_ANNEE = re.compile(r"\b(19[89]\d|20[0-4]\d)\b")
+MOTIF_ANNEE_EN_COURS = re.compile(r"aujourd['’]hui|[àa] ce jour|\bpr[ée]sent\b|\bactuellement\b|\bnow\b|\bcurrent\b",
+                                  re.IGNORECASE)
+AGE_RECENCE_PLEINE = 2
+AGE_RECENCE_MINIMALE = 10
+FACTEUR_RECENCE_MIN = 0.5
+FACTEUR_RECENCE_INCONNUE = 0.8
+
+def _niveau_indices(texte_replie: str) -> Optional[str]:
+    if INDICES_SOUHAITEE.search(texte_replie):
+        return 'souhaitée'
+    if INDICES_OBLIGATOIRE.search(texte_replie):
+        return 'obligatoire'
+    return None
+
+def niveaux_exigence(texte_mission: str, competences: Dict[str, List[int]]) -> Dict[str, str]:
+    """Niveau d'exigence de chaque compétence de la mission : obligatoire, standard ou souhaitée
+
+    Le niveau vient de la phrase qui cite la compétence, à défaut de l'intitulé de la liste qui
+    la contient (« Compétences requises : », « Serait un plus : »). Le niveau le plus fort
+    parmi les occurrences l'emporte.
+    """
+    # Lignes : (début, fin, niveau hérité de l'intitulé de liste en cours)
+    lignes, niveau_section, debut = [], None, 0
+    for ligne in texte_mission.split('\n'):
+        fin = debut + len(ligne)
+        if ligne.rstrip().endswith(':'):
+            niveau_section = _niveau_indices(normaliser_texte(ligne))
+        lignes.append((debut, fin, niveau_section))
+        debut = fin + 1
+    debuts_lignes = [d for d, _, _ in lignes]
+
+    ordre = ('souhaitée', 'standard', 'obligatoire')
+    niveaux = {}
+    for mot_cle, positions in competences.items():
+        meilleur = 'souhaitée' if positions else 'standard'
+        for position in positions:
+            debut_ligne, fin_ligne, niveau_section = lignes[bisect.bisect_right(debuts_lignes, position) - 1]
+            ligne = texte_mission[debut_ligne:fin_ligne]
+            relative = position - debut_ligne
+            delimiteurs = [m.start() for m in DELIMITEURS_PHRASE.finditer(ligne)]
+            debut_phrase = max([d + 1 for d in delimiteurs if d < relative], default=0)
+            fin_phrase = min([d for d in delimiteurs if d > relative], default=len(ligne))
+            niveau = (_niveau_indices(normaliser_texte(ligne[debut_phrase:fin_phrase]))
+                      or niveau_section or 'standard')
+            if ordre.index(niveau) > ordre.index(meilleur):
+                meilleur = niveau
+        niveaux[mot_cle] = meilleur
+    return niveaux
+
+def reperer_annees(texte: str) -> List[Tuple[int, int]]:
+    """Positions des années (et des mentions « à ce jour », « présent ») dans un dossier"""
+    annee_courante = datetime.date.today().year
+    reperes = [(m.start(), int(m.group())) for m in MOTIF_ANNEE.finditer(texte)]
+    reperes += [(m.start(), annee_courante) for m in MOTIF_ANNEE_EN_COURS.finditer(texte)]
+    return sorted(reperes)
+
+def _annee_la_plus_proche(annees: List[Tuple[int, int]], position: int) -> Optional[int]:
+    """Année du repère qui précède la position (en-tête de période), sinon du premier qui la suit"""
+    if not annees:
+        return None
+    indice = bisect.bisect_right(annees, (position, float('inf')))
+    return annees[indice - 1][1] if indice > 0 else annees[0][1]
+
+def facteur_recence(annee: Optional[int]) -> float:
+    """1.0 pour une compétence pratiquée ces 2 dernières années, décroît jusqu'à 0.5 à 10 ans"""
+    if annee is None:
+        return FACTEUR_RECENCE_INCONNUE
+    age = datetime.date.today().year - annee
+    if age <= AGE_RECENCE_PLEINE:
+        return 1.0
+    if age >= AGE_RECENCE_MINIMALE:
+        return FACTEUR_RECENCE_MIN
+    pente = (1.0 - FACTEUR_RECENCE_MIN) / (AGE_RECENCE_MINIMALE - AGE_RECENCE_PLEINE)
+    return 1.0 - pente * (age - AGE_RECENCE_PLEINE)
+
+def facteur_frequence(occurrences: int) -> float:
+    """0.6 pour une mention isolée, 1.0 à partir de 3 mentions dans le dossier"""
+    return min(1.0, 0.6 + 0.2 * (occurrences - 1)) if occurrences else 0.0
+
+@dataclass(frozen=True)
+class ScoreAdequation:
+    """Score d'adéquation pondéré et contributions qui l'expliquent"""
+    score: float
+    points: float
+    points_max: float
+    # Une entrée par compétence de la mission, positions dans les textes mission et dossier
+    contributions: List[Dict[str, Any]]
+
+def expliquer_score_adequation(analyse_mission: AnalyseMission, analyse_cv: AnalyseCv) -> ScoreAdequation:
+    """Compare les compétences demandées par la mission à celles du dossier, sans nouveau passage
+
+    Chaque compétence pèse selon son niveau d'exigence ; sa couverture par le dossier dépend du
+    nombre de mentions et de la récence (année la plus récente associée à une mention).
+    """
+    contributions = []
+    for mot_cle, demande in analyse_mission.competences.items():
+        poids = POIDS_EXIGENCE[demande['exigence']]
+        positions_cv = analyse_cv.scan.get(mot_cle, [])
+        annees = [a for a in (_annee_la_plus_proche(analyse_cv.annees, p) for p in positions_cv) if a]
+        annee = max(annees) if annees else None
+        frequence = facteur_frequence(len(positions_cv))
+        recence = facteur_recence(annee) if positions_cv else 0.0
+        contributions.append({
+            'competence': mot_cle,
+            'exigence': demande['exigence'],
+            'poids': poids,
+            'present': bool(positions_cv),
+            'occurrences_cv': len(positions_cv),
+            'annee': annee,
+            'facteur_frequence': frequence,
+            'facteur_recence': recence,
+            'points': poids * frequence * recence,
+            'positions_mission': demande['positions'],
+            'positions_cv': positions_cv,
+        })
+
+    contributions.sort(key=lambda c: (-c['poids'], -c['points'], c['competence']))
+    points = sum(c['points'] for c in contributions)
+    points_max = sum(c['poids'] for c in contributions)
+    score = points / points_max if points_max else 0.0
+    return ScoreAdequation(score=score, points=points, points_max=points_max, contributions=contributions)
+
+def score_depuis_analyses(analyse_mission: AnalyseMission, analyse_cv: AnalyseCv) -> float:
+    """Score d'adéquation calculé à partir des analyses déjà disponibles"""
+    return expliquer_score_adequation(analyse_mission, analyse_cv).score
 
 def calculer_score_adequation(dossier_competences: str, texte_mission: str) -> float:
     """Calcule un score d'adéquation entre le dossier et la mission"""
-    domaine = detecter_domaine_mission(texte_mission)
-    categories = extraire_categories_connaissances_par_domaine(dossier_competences, domaine)
-    
-    score_total = sum(len(mots) for mots in categories.values() if mots)
-    score_max = sum(len(keywords) for keywords in categories.values())
-    
-    return min(score_total / max(score_max, 1), 1.0) if score_max > 0 else 0
+    taxonomie = obtenir_taxonomie()
+    return score_depuis_analyses(analyser_mission(texte_mission, taxonomie),
+                                 analyser_cv(dossier_competences, taxonomie))
 
 def generer_rapport_optimisation(donnees_originales: str, donnees_optimisees: dict, 
-                                 texte_mission: str) -> dict:
+                                 texte_mission: str, analyse_mission: Optional[AnalyseMission] = None,
+                                 analyse_cv: Optional[AnalyseCv] = None) -> dict:
     """Génère un rapport d'optimisation détaillé"""
-    domaine = detecter_domaine_mission(texte_mission)
-    categories = extraire_categories_connaissances_par_domaine(donnees_originales, domaine)
+    # Les analyses fournies par l'appelant fixent l'instantané de taxonomie de toute la génération
+    taxonomie = analyse_mission.taxonomie if analyse_mission else obtenir_taxonomie()
+    analyse_mission = analyse_mission or analyser_mission(texte_mission, taxonomie)
+    analyse_cv = analyse_cv or analyser_cv(donnees_originales, taxonomie)
+    categories = analyse_cv.categories_domaines([d for d, _ in analyse_mission.domaines])
+    explication_score = expliquer_score_adequation(analyse_mission, analyse_cv)
     
     rapport = {
-        'domaine_detecte': domaine,
-        'score_adequation': calculer_score_adequation(donnees_originales, texte_mission),
+        'domaine_detecte': analyse_mission.domaine,
+        'domaines_detectes': analyse_mission.domaines,
+        'version_taxonomie': taxonomie.version,
+        'score_adequation': explication_score.score,
+        'explication_score': explication_score,
         'categories_identifiees': list(categories.keys()),
         'nb_experiences': len(donnees_optimisees.get('experiences', [])),
         'nb_formations': len(donnees_optimisees.get('formations', [])),
@@ -299,113 +1127,1217 @@ def generer_rapport_optimisation(donnees_originales: str, donnees_optimisees: di
     
     return rapport
 
-def sauvegarder_historique_generation(donnees: dict, nom_fichier: str, rapport: dict):
-    """Sauvegarde l'historique des générations"""
+def sauvegarder_historique_generation(donnees: dict, nom_fichier: str, rapport: dict):
+    """Sauvegarde l'historique des générations"""
+    try:
+        historique = {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'nom_consultant': donnees.get('nom_consultant', 'Inconnu'),
+            'titre_poste': donnees.get('titre_du_poste', 'Inconnu'),
+            'domaine_mission': rapport.get('domaine_detecte', 'Non défini'),
+            'score_adequation': rapport.get('score_adequation', 0),
+            'nom_fichier': nom_fichier,
+            'nb_experiences': len(donnees.get('experiences', [])),
+            'nb_formations': len(donnees.get('formations', []))
+        }
+        
+        st.info(f"📝 Génération enregistrée : {historique['nom_consultant']} - {historique['domaine_mission']} - Score: {historique['score_adequation']:.1%}")
+        
+    except Exception as e:
+        st.warning(f"Erreur lors de la sauvegarde : {str(e)}")
+
+# === CONFIGURATION OPENAI ===
+# Un seul client par clé API pour tout le processus : pool de connexions HTTP maintenues ouvertes
+# (keep-alive), partagé par les sessions et les reruns Streamlit au lieu d'une poignée de main TLS par appel
+DELAI_CONNEXION_OPENAI_S = float(os.environ.get("COMAI_OPENAI_DELAI_CONNEXION_S", 10))
+DELAI_REPONSE_OPENAI_S = float(os.environ.get("COMAI_OPENAI_DELAI_REPONSE_S", 180))
+NB_CONNEXIONS_MAX_OPENAI = 20
+NB_CONNEXIONS_KEEPALIVE_OPENAI = 10
+DUREE_KEEPALIVE_OPENAI_S = 120
+# Ouvre la première connexion (DNS + TLS) en arrière-plan dès la création du client
+PRECHAUFFER_CLIENT_OPENAI = True
+
+_clients_openai = {}
+_verrou_clients_openai = threading.Lock()
+statistiques_client_openai = {
+    'creations': 0,
+    'reutilisations': 0,
+    'duree_creation_ms': 0.0,
+    'duree_prechauffage_ms': None,
+    'erreur_prechauffage': None
+}
+
+def _prechauffer_client_openai(client: OpenAI):
+    """Établit la connexion TLS du pool par une requête légère, et mesure sa durée"""
+    debut = time.perf_counter()
+    try:
+        client.models.list()
+        statistiques_client_openai['erreur_prechauffage'] = None
+    except Exception as e:
+        statistiques_client_openai['erreur_prechauffage'] = str(e)
+    statistiques_client_openai['duree_prechauffage_ms'] = (time.perf_counter() - debut) * 1000
+
+def obtenir_client_openai(api_key: str) -> OpenAI:
+    """Client OpenAI partagé par le processus pour cette clé API, créé au premier appel"""
+    empreinte_cle = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    client = _clients_openai.get(empreinte_cle)
+    if client is not None:
+        statistiques_client_openai['reutilisations'] += 1
+        return client
+
+    with _verrou_clients_openai:
+        client = _clients_openai.get(empreinte_cle)
+        if client is not None:
+            statistiques_client_openai['reutilisations'] += 1
+            return client
+
+        debut = time.perf_counter()
+        client_http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=NB_CONNEXIONS_MAX_OPENAI,
+                max_keepalive_connections=NB_CONNEXIONS_KEEPALIVE_OPENAI,
+                keepalive_expiry=DUREE_KEEPALIVE_OPENAI_S
+            ),
+            timeout=httpx.Timeout(DELAI_REPONSE_OPENAI_S, connect=DELAI_CONNEXION_OPENAI_S),
+            follow_redirects=True
+        )
+        client = OpenAI(api_key=api_key, http_client=client_http)
+        statistiques_client_openai['duree_creation_ms'] = (time.perf_counter() - debut) * 1000
+        statistiques_client_openai['creations'] += 1
+        _clients_openai[empreinte_cle] = client
+
+    if PRECHAUFFER_CLIENT_OPENAI:
+        threading.Thread(target=_prechauffer_client_openai, args=(client,), daemon=True).start()
+    return client
+
+# Les appels asynchrones (génération par sections) s'exécutent sur une boucle d'événements dédiée,
+# démarrée une fois par processus : le client asynchrone et son pool de connexions y restent attachés
+_boucle_openai = None
+
+def executer_sur_boucle_openai(coroutine) -> Future:
+    """Planifie une coroutine sur la boucle OpenAI partagée et retourne un Future concurrent"""
+    global _boucle_openai
+    with _verrou_clients_openai:
+        if _boucle_openai is None:
+            _boucle_openai = asyncio.new_event_loop()
+            threading.Thread(target=_boucle_openai.run_forever, name="boucle_openai", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _boucle_openai)
+
+def obtenir_client_openai_async(api_key: str) -> AsyncOpenAI:
+    """Client asynchrone partagé pour cette clé API, à n'utiliser que sur la boucle OpenAI"""
+    cle = ('async', hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+    with _verrou_clients_openai:
+        client = _clients_openai.get(cle)
+        if client is None:
+            client_http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=NB_CONNEXIONS_MAX_OPENAI,
+                    max_keepalive_connections=NB_CONNEXIONS_KEEPALIVE_OPENAI,
+                    keepalive_expiry=DUREE_KEEPALIVE_OPENAI_S
+                ),
+                timeout=httpx.Timeout(DELAI_REPONSE_OPENAI_S, connect=DELAI_CONNEXION_OPENAI_S),
+                follow_redirects=True
+            )
+            client = AsyncOpenAI(api_key=api_key, http_client=client_http)
+            _clients_openai[cle] = client
+    return client
+
+def configurer_openai(asynchrone: bool = False):
+    """Retourne le client OpenAI partagé, ou None si aucune clé API n'est configurée"""
+    try:
+        api_key = st.secrets.get("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        if asynchrone:
+            return obtenir_client_openai_async(api_key)
+        return obtenir_client_openai(api_key)
+        
+    except FileNotFoundError:
+        # Aucun fichier secrets.toml : même cas qu'une clé absente
+        return None
+    except Exception as e:
+        st.error(f"Erreur de configuration OpenAI : {str(e)}")
+        return None
+
+# === CACHE D'EXTRACTION ===
+
+# À incrémenter dès que la sortie d'un lecteur change, pour invalider le cache
+VERSIONS_LECTEURS = {'pdf': 2, 'word': 2, 'txt': 2}
+
+REPERTOIRE_CACHE_EXTRACTION = os.environ.get("COMAI_CACHE_EXTRACTION", ".cache_extraction")
+NB_ENTREES_CACHE_MEMOIRE = 64
+TAILLE_MAX_CACHE_DISQUE_MB = 200
+
+class CacheExtraction:
+    """Cache des extractions (valeurs JSON), adressé par contenu : un niveau mémoire (LRU) et un niveau disque"""
+
+    def __init__(self, repertoire: str, nb_entrees_memoire: int, taille_max_disque_mb: int):
+        self.repertoire = repertoire
+        self.taille_max_disque = taille_max_disque_mb * 1024 * 1024
+        self.memoire = CacheLRU(nb_entrees_memoire)
+        self._verrou = threading.Lock()
+        self.compteurs = {
+            'hits_memoire': 0,
+            'hits_disque': 0,
+            'misses': 0,
+            'ecritures_disque': 0,
+            'evictions_disque': 0
+        }
+
+    def _incrementer(self, compteur: str):
+        with self._verrou:
+            self.compteurs[compteur] += 1
+
+    def _chemin(self, cle: str) -> str:
+        return os.path.join(self.repertoire, f"{cle}.json")
+
+    def obtenir(self, cle: str):
+        valeur = self.memoire.obtenir(cle)
+        if valeur is not None:
+            self._incrementer('hits_memoire')
+            return valeur
+
+        chemin = self._chemin(cle)
+        try:
+            with open(chemin, 'r', encoding='utf-8') as f:
+                valeur = json.load(f)
+            os.utime(chemin)  # l'éviction disque se base sur la date du dernier accès
+        except (OSError, ValueError):
+            self._incrementer('misses')
+            return None
+
+        self.memoire.enregistrer(cle, valeur)
+        self._incrementer('hits_disque')
+        return valeur
+
+    def enregistrer(self, cle: str, valeur):
+        self.memoire.enregistrer(cle, valeur)
+        try:
+            os.makedirs(self.repertoire, exist_ok=True)
+            # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+            fd, chemin_tmp = tempfile.mkstemp(dir=self.repertoire, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(valeur, f, ensure_ascii=False)
+            os.replace(chemin_tmp, self._chemin(cle))
+            self._incrementer('ecritures_disque')
+            self._evincer_disque()
+        except OSError:
+            # Le niveau disque est facultatif (système de fichiers en lecture seule, etc.)
+            pass
+
+    def _evincer_disque(self):
+        """Supprime les entrées les plus anciennes tant que le cache dépasse sa taille max"""
+        with self._verrou:
+            entrees = [e for e in os.scandir(self.repertoire) if e.name.endswith(".json")]
+            taille_totale = sum(e.stat().st_size for e in entrees)
+            if taille_totale <= self.taille_max_disque:
+                return
+
+            for entree in sorted(entrees, key=lambda e: e.stat().st_mtime):
+                if taille_totale <= self.taille_max_disque:
+                    break
+                taille = entree.stat().st_size
+                try:
+                    os.remove(entree.path)
+                except OSError:
+                    continue
+                taille_totale -= taille
+                self.compteurs['evictions_disque'] += 1
+
+    def statistiques(self) -> Dict[str, Any]:
+        """Compteurs cumulés depuis le démarrage du processus"""
+        with self._verrou:
+            stats = dict(self.compteurs)
+        total = stats['hits_memoire'] + stats['hits_disque'] + stats['misses']
+        stats['taux_hit'] = (stats['hits_memoire'] + stats['hits_disque']) / total if total else 0.0
+        stats['entrees_memoire'] = len(self.memoire)
+        return stats
+
+cache_extraction = CacheExtraction(
+    REPERTOIRE_CACHE_EXTRACTION, NB_ENTREES_CACHE_MEMOIRE, TAILLE_MAX_CACHE_DISQUE_MB
+)
+
+# === INDEX DE DOSSIERS (SIDECARS) ===
+
+# Sidecars produits hors ligne par indexer_dossiers.py, nommés <sha256>.json
+REPERTOIRE_INDEX_DOSSIERS = os.environ.get("COMAI_INDEX_DOSSIERS", "index_dossiers")
+VERSION_FORMAT_SIDECAR = 1
+
+compteurs_sidecars = {'hits': 0, 'misses': 0}
+
+def chemin_sidecar(empreinte: str, repertoire: Optional[str] = None) -> str:
+    return os.path.join(repertoire or REPERTOIRE_INDEX_DOSSIERS, f"{empreinte}.json")
+
+def charger_sidecar(empreinte: str, type_lecteur: str) -> Optional[Dict[str, Any]]:
+    """Charge le sidecar pré-calculé d'un dossier s'il correspond au contenu et au lecteur actuels"""
+    try:
+        with open(chemin_sidecar(empreinte), 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        compteurs_sidecars['misses'] += 1
+        return None
+
+    if (sidecar.get('version_format') != VERSION_FORMAT_SIDECAR
+            or sidecar.get('empreinte') != empreinte
+            or sidecar.get('lecteur') != type_lecteur
+            or sidecar.get('version_lecteur') != VERSIONS_LECTEURS[type_lecteur]):
+        compteurs_sidecars['misses'] += 1
+        return None
+
+    compteurs_sidecars['hits'] += 1
+    return sidecar
+
+def calculer_empreinte_fichier(fichier) -> str:
+    """Calcule le SHA-256 du contenu d'un fichier uploadé sans en copier les octets"""
+    empreinte = hashlib.sha256()
+    if hasattr(fichier, 'getbuffer'):
+        with fichier.getbuffer() as vue:
+            empreinte.update(vue)
+    else:
+        fichier.seek(0)
+        contenu = fichier.read()
+        empreinte.update(contenu.encode('utf-8') if isinstance(contenu, str) else contenu)
+    fichier.seek(0)
+    return empreinte.hexdigest()
+
+# Compteurs propres à un décodage : sans objet quand tout le document est servi depuis le cache
+CLES_RAPPORT_PAR_DECODAGE = ('pages_depuis_cache',)
+
+def avec_cache_extraction(type_lecteur: str, parametres_cle: tuple = ()):
+    """Décorateur : sert le texte extrait depuis le cache quand le même contenu a déjà été lu
+
+    `parametres_cle` liste les arguments nommés du lecteur qui modifient le texte produit
+    (ils entrent dans la clé). Si le lecteur accepte un argument `rapport`, le dictionnaire
+    qu'il remplit est mis en cache avec le texte et restitué à l'appelant lors d'un hit, sans
+    les compteurs du décodage d'origine (CLES_RAPPORT_PAR_DECODAGE).
+    Lors d'un hit, le rappel de progression `rappel_page` reçoit chaque page du texte en cache,
+    comme après un décodage.
+    """
+    def decorateur(lecteur):
+        accepte_rapport = 'rapport' in inspect.signature(lecteur).parameters
+
+        def restituer_rapport(rapport: Optional[Dict[str, Any]], entree: Dict[str, Any]):
+            if rapport is not None:
+                rapport.update({cle: valeur for cle, valeur in entree['rapport'].items()
+                                if cle not in CLES_RAPPORT_PAR_DECODAGE})
+
+        def rejouer_pages(texte: str, kwargs: Dict[str, Any]):
+            rappel_page = kwargs.get('rappel_page')
+            if rappel_page and texte:
+                for index, texte_page in enumerate(texte.split(SEPARATEUR_PAGES)):
+                    rappel_page(index, texte_page)
+
+        @functools.wraps(lecteur)
+        def wrapper(fichier, *args, rapport: Optional[Dict[str, Any]] = None, **kwargs):
+            if accepte_rapport:
+                kwargs['rapport'] = rapport if rapport is not None else {}
+            try:
+                empreinte = calculer_empreinte_fichier(fichier)
+            except Exception:
+                return lecteur(fichier, *args, **kwargs)
+
+            cle = f"{type_lecteur}-v{VERSIONS_LECTEURS[type_lecteur]}-{empreinte}"
+            for parametre in parametres_cle:
+                if kwargs.get(parametre) is not None:
+                    cle += f"-{parametre}{kwargs[parametre]}"
+
+            entree = cache_extraction.obtenir(cle)
+            if entree is not None:
+                restituer_rapport(rapport, entree)
+                rejouer_pages(entree['texte'], kwargs)
+                return entree['texte']
+
+            # Dossier de la bibliothèque indexée hors ligne : pas de parsing PDF/DOCX
+            sidecar = None if any(kwargs.get(p) for p in parametres_cle) else charger_sidecar(empreinte, type_lecteur)
+            if sidecar is not None:
+                entree = {'texte': sidecar['texte'], 'rapport': sidecar.get('rapport', {})}
+                cache_extraction.memoire.enregistrer(cle, entree)
+                restituer_rapport(rapport, entree)
+                rejouer_pages(entree['texte'], kwargs)
+                return entree['texte']
+
+            texte = lecteur(fichier, *args, **kwargs)
+            if texte:
+                cache_extraction.enregistrer(cle, {'texte': texte, 'rapport': dict(kwargs.get('rapport', {}))})
+            return texte
+        return wrapper
+    return decorateur
+
+# === LECTURE DE FICHIERS ===
+
+# Saut de page (form feed) entre les pages PDF : permet de repérer en-têtes et pieds de page
+SEPARATEUR_PAGES = "\f"
+
+# Au-delà de ce nombre de pages, l'extraction est répartie sur un pool de processus
+SEUIL_PAGES_PARALLELE = 24
+NB_PROCESSUS_PDF = max(1, min(4, (os.cpu_count() or 1)))
+
+_pool_processus_pdf = None
+
+def _obtenir_pool_processus_pdf() -> ProcessPoolExecutor:
+    """Crée (une seule fois) le pool de processus partagé pour l'extraction PDF"""
+    global _pool_processus_pdf
+    if _pool_processus_pdf is None:
+        # 'spawn' évite de forker le serveur Streamlit et ses threads
+        _pool_processus_pdf = ProcessPoolExecutor(
+            max_workers=NB_PROCESSUS_PDF,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool_processus_pdf
+
+# Cache du texte par page, indexé par l'empreinte du contenu brut de la page : quand un
+# dossier est re-uploadé après une petite correction, seules les pages modifiées sont décodées
+NB_ENTREES_CACHE_PAGES = 2048
+TAILLE_MAX_CACHE_PAGES_MB = 50
+
+cache_pages_pdf = CacheExtraction(
+    os.path.join(REPERTOIRE_CACHE_EXTRACTION, "pages"), NB_ENTREES_CACHE_PAGES, TAILLE_MAX_CACHE_PAGES_MB
+)
+
+# Programmes de glyphes (sans effet sur le texte extrait) et liens vers l'arbre des pages
+CLES_PDF_HORS_EMPREINTE = frozenset({'/FontFile', '/FontFile2', '/FontFile3', '/Parent'})
+
+def _empreinter_objet_pdf(empreinte, objet, vus: set):
+    """Ajoute à l'empreinte la valeur résolue d'un objet PDF : références suivies, flux décodés
+
+    Le texte d'un IndirectObject contient l'identifiant du lecteur, différent à chaque upload :
+    seules les valeurs résolues sont hachées. Les images n'ont pas d'effet sur le texte et sont ignorées.
+    """
+    # Tests de type rapides : isinstance sur les classes PyPDF2 passe par un protocole typing, coûteux
+    # sur les tableaux /Widths de centaines de nombres
+    if type(objet) is IndirectObject:
+        reference = (objet.idnum, objet.generation)
+        if reference in vus:
+            empreinte.update(b"<deja vu>")
+            return
+        vus.add(reference)
+        objet = objet.get_object()
+
+    if isinstance(objet, dict):
+        if objet.get('/Subtype') == '/Image':
+            empreinte.update(b"image")
+            return
+        for cle in sorted(objet):
+            if cle not in CLES_PDF_HORS_EMPREINTE:
+                empreinte.update(cle.encode())
+                _empreinter_objet_pdf(empreinte, objet.raw_get(cle), vus)
+        if isinstance(objet, StreamObject):
+            empreinte.update(objet.get_data())
+    elif isinstance(objet, list):
+        if any(type(element) is IndirectObject or isinstance(element, (dict, list)) for element in objet):
+            empreinte.update(b"[")
+            for element in objet:
+                _empreinter_objet_pdf(empreinte, element, vus)
+            empreinte.update(b"]")
+        else:
+            empreinte.update(repr(objet).encode())
+    else:
+        empreinte.update(repr(objet).encode())
+
+def empreinte_page_pdf(page) -> str:
+    """SHA-256 de ce qui détermine le texte d'une page : flux de contenu, polices, formulaires XObject, rotation"""
+    empreinte = hashlib.sha256()
+    contenu = page.get_contents()
+    if contenu is not None:
+        empreinte.update(contenu.get_data())
+
+    ressources = page.get('/Resources')
+    if ressources is not None:
+        ressources = ressources.get_object()
+        # Les formulaires XObject sont rendus par extract_text : leurs flux et polices comptent aussi
+        vus = set()
+        for cle in ('/Font', '/XObject'):
+            if cle in ressources:
+                empreinte.update(cle.encode())
+                _empreinter_objet_pdf(empreinte, ressources.raw_get(cle), vus)
+
+    empreinte.update(str(page.get('/Rotate', 0)).encode())
+    return empreinte.hexdigest()
+
+def _cle_cache_page(empreinte: str) -> str:
+    return f"page-v{VERSIONS_LECTEURS['pdf']}-{empreinte}"
+
+def _extraire_pages_pdf(donnees_pdf: bytes, indices: List[int]) -> List[str]:
+    """Extrait le texte des pages demandées (exécuté dans un processus du pool)"""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(donnees_pdf))
+    return [(pdf_reader.pages[i].extract_text() or "") for i in indices]
+
+def iterer_pages_pdf(fichier_pdf, parallele: Optional[bool] = None,
+                     rapport: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Produit le texte de chaque page d'un PDF, dans l'ordre, au fil de l'extraction
+
+    Les pages déjà vues (même empreinte de contenu) sont servies par le cache de pages ;
+    les autres sont décodées à la demande : arrêter l'itération arrête l'extraction.
+    """
+    fichier_pdf.seek(0)
+    donnees_pdf = fichier_pdf.read()
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(donnees_pdf))
+    nb_pages = len(pdf_reader.pages)
+    rapport = rapport if rapport is not None else {}
+    rapport['pages_total'] = nb_pages
+    rapport['pages_depuis_cache'] = 0
+
+    if parallele is False:
+        # Mode paresseux : empreinte, cache puis extraction, page par page
+        for page in pdf_reader.pages:
+            cle = _cle_cache_page(empreinte_page_pdf(page))
+            texte = cache_pages_pdf.obtenir(cle)
+            if texte is None:
+                texte = page.extract_text() or ""
+                cache_pages_pdf.enregistrer(cle, texte)
+            else:
+                rapport['pages_depuis_cache'] += 1
+            yield texte
+        return
+
+    cles = [_cle_cache_page(empreinte_page_pdf(page)) for page in pdf_reader.pages]
+    textes = [cache_pages_pdf.obtenir(cle) for cle in cles]
+    a_extraire = [i for i, texte in enumerate(textes) if texte is None]
+    rapport['pages_depuis_cache'] = nb_pages - len(a_extraire)
+
+    if parallele is None:
+        parallele = len(a_extraire) >= SEUIL_PAGES_PARALLELE and NB_PROCESSUS_PDF > 1
+
+    if not parallele:
+        for i, texte in enumerate(textes):
+            if texte is None:
+                texte = pdf_reader.pages[i].extract_text() or ""
+                cache_pages_pdf.enregistrer(cles[i], texte)
+            yield texte
+        return
+
+    # Découpage des pages à extraire en blocs contigus : chaque processus n'analyse le PDF qu'une fois
+    taille_bloc = -(-len(a_extraire) // NB_PROCESSUS_PDF)
+    blocs = [a_extraire[debut:debut + taille_bloc] for debut in range(0, len(a_extraire), taille_bloc)]
+    pool = _obtenir_pool_processus_pdf()
+    futures = [pool.submit(_extraire_pages_pdf, donnees_pdf, bloc) for bloc in blocs]
+    bloc_par_page = {i: (n, position) for n, bloc in enumerate(blocs) for position, i in enumerate(bloc)}
+
     try:
-        historique = {
-            'timestamp': datetime.datetime.now().isoformat(),
-            'nom_consultant': donnees.get('nom_consultant', 'Inconnu'),
-            'titre_poste': donnees.get('titre_du_poste', 'Inconnu'),
-            'domaine_mission': rapport.get('domaine_detecte', 'Non défini'),
-            'score_adequation': rapport.get('score_adequation', 0),
-            'nom_fichier': nom_fichier,
-            'nb_experiences': len(donnees.get('experiences', [])),
-            'nb_formations': len(donnees.get('formations', []))
-        }
-        
-        st.info(f"📝 Génération enregistrée : {historique['nom_consultant']} - {historique['domaine_mission']} - Score: {historique['score_adequation']:.1%}")
-        
-    except Exception as e:
-        st.warning(f"Erreur lors de la sauvegarde : {str(e)}")
+        for i, texte in enumerate(textes):
+            if texte is None:
+                n, position = bloc_par_page[i]
+                texte = futures[n].result()[position]
+                cache_pages_pdf.enregistrer(cles[i], texte)
+            yield texte
+    finally:
+        # Itération interrompue : les blocs pas encore démarrés sont abandonnés
+        for future in futures:
+            future.cancel()
 
-# === CONFIGURATION OPENAI ===
+@avec_cache_extraction('pdf', parametres_cle=('budget_tokens',))
+def lire_fichier_pdf(fichier_pdf, rappel_page: Optional[Callable[[int, str], None]] = None,
+                     budget_tokens: Optional[int] = None, rapport: Optional[Dict[str, Any]] = None) -> str:
+    """Extrait le texte d'un fichier PDF
 
-def configurer_openai():
+    `rappel_page(index, texte)` est appelé dès qu'une page est décodée, ce qui permet
+    à l'appelant de commencer l'analyse avant la fin de l'extraction.
+    Avec `budget_tokens`, le décodage s'arrête dès que le texte collecté atteint le budget ;
+    `rapport` reçoit alors le nombre de pages lues et ignorées.
+    """
     try:
-        import openai
-        st.write(f"Version OpenAI: {openai.__version__}")
-        
-        from openai import OpenAI
-        api_key = st.secrets.get("OPENAI_API_KEY")
-        
-        # Essai minimal
-        client = OpenAI(api_key=api_key)
-        return client
-        
-    except Exception as e:
-        st.write(f"Erreur détaillée: {str(e)}")
-        st.write(f"Type d'erreur: {type(e)}")
-        return None
-    
-# === LECTURE DE FICHIERS ===
+        budget_caracteres = budget_tokens * CARACTERES_PAR_TOKEN if budget_tokens else None
+        rapport = rapport if rapport is not None else {}
+        pages = []
+        nb_caracteres = 0
+        # En mode budget, extraction séquentielle pour ne décoder que les pages nécessaires
+        for index, texte_page in enumerate(iterer_pages_pdf(
+                fichier_pdf, parallele=False if budget_caracteres else None, rapport=rapport)):
+            pages.append(texte_page)
+            nb_caracteres += len(texte_page)
+            if rappel_page:
+                rappel_page(index, texte_page)
+            if budget_caracteres and nb_caracteres >= budget_caracteres:
+                break
 
-def lire_fichier_pdf(fichier_pdf) -> str:
-    """Extrait le texte d'un fichier PDF"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(fichier_pdf)
-        texte = ""
-        for page in pdf_reader.pages:
-            texte += page.extract_text() + "\n"
-        return texte.strip()
+        rapport['pages_lues'] = len(pages)
+        rapport['pages_ignorees'] = rapport['pages_total'] - len(pages)
+        return SEPARATEUR_PAGES.join(pages).strip()
     except Exception as e:
         st.error(f"Erreur lors de la lecture du PDF : {str(e)}")
         return ""
 
+# Ordre important : le BOM UTF-32 LE commence par le BOM UTF-16 LE
+BOMS_ENCODAGES = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+TAILLE_BLOC_DECODAGE = 1024 * 1024
+TAILLE_ECHANTILLON_ENCODAGE = 64 * 1024
+# Octets sans caractère en cp1252 : leur présence désigne du latin-1
+OCTETS_NON_DEFINIS_CP1252 = frozenset(b"\x81\x8d\x8f\x90\x9d")
+
+def _choisir_encodage_8_bits(echantillon) -> str:
+    """Départage cp1252 et latin-1 sur un échantillon d'octets non UTF-8
+
+    Les octets 0x80-0x9F sont des caractères typographiques en cp1252 (’ “ ” – € …)
+    mais des codes de contrôle C1 en latin-1, qu'on ne rencontre pas dans du texte.
+    Au-delà de 0x9F les deux encodages coïncident, cp1252 est donc le choix par défaut.
+    """
+    if not OCTETS_NON_DEFINIS_CP1252.isdisjoint(echantillon):
+        return 'latin-1'
+    return 'cp1252'
+
+def decoder_texte(donnees) -> Tuple[str, str]:
+    """Décode des octets en une seule passe et retourne (texte, encodage détecté)"""
+    vue = memoryview(donnees)
+
+    for bom, encodage in BOMS_ENCODAGES:
+        if vue[:len(bom)] == bom:
+            return str(vue, encodage), encodage
+
+    # Validation UTF-8 incrémentale : le texte décodé est produit au fil de la validation
+    decodeur = codecs.getincrementaldecoder('utf-8')()
+    morceaux = []
+    for debut in range(0, len(vue), TAILLE_BLOC_DECODAGE):
+        fin = debut + TAILLE_BLOC_DECODAGE
+        try:
+            morceaux.append(decodeur.decode(vue[debut:fin], final=fin >= len(vue)))
+        except UnicodeDecodeError as e:
+            position_erreur = debut + e.start
+            break
+    else:
+        return "".join(morceaux), 'utf-8'
+
+    echantillon = vue[position_erreur:position_erreur + TAILLE_ECHANTILLON_ENCODAGE]
+    encodage = _choisir_encodage_8_bits(echantillon)
+    try:
+        return str(vue, encodage), encodage
+    except UnicodeDecodeError:
+        # Octet non défini en cp1252 hors de l'échantillon : latin-1 ne peut pas échouer
+        return str(vue, 'latin-1'), 'latin-1'
+
+@avec_cache_extraction('txt')
 def lire_fichier_txt(fichier_txt) -> str:
     """Lit le contenu d'un fichier texte"""
     try:
-        encodings = ['utf-8', 'latin-1', 'cp1252']
-        for encoding in encodings:
-            try:
-                fichier_txt.seek(0)
-                contenu = fichier_txt.read()
-                if isinstance(contenu, bytes):
-                    return contenu.decode(encoding)
-                return contenu
-            except UnicodeDecodeError:
-                continue
-        return ""
+        if hasattr(fichier_txt, 'getbuffer'):
+            with fichier_txt.getbuffer() as vue:
+                texte, _ = decoder_texte(vue)
+            return texte
+
+        fichier_txt.seek(0)
+        contenu = fichier_txt.read()
+        if isinstance(contenu, str):
+            return contenu
+        texte, _ = decoder_texte(contenu)
+        return texte
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier texte : {str(e)}")
         return ""
 
+_NS_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_NS_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+_TYPE_DOCUMENT_PRINCIPAL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+def _chemin_document_principal(archive: zipfile.ZipFile) -> str:
+    """Retrouve la partie principale du .docx via _rels/.rels (word/document.xml en général)"""
+    try:
+        relations = etree.fromstring(archive.read("_rels/.rels"))
+        for relation in relations:
+            if relation.get("Type") == _TYPE_DOCUMENT_PRINCIPAL:
+                return relation.get("Target").lstrip("/")
+    except (KeyError, etree.XMLSyntaxError):
+        pass
+    return "word/document.xml"
+
+def _iterer_blocs_document_xml(flux) -> Iterator[str]:
+    """Parcourt document.xml en flux et produit paragraphes et lignes de tableau dans l'ordre"""
+    paragraphes = []   # pile des paragraphes ouverts (zones de texte imbriquées)
+    cellules = []      # pile des cellules ouvertes : liste des paragraphes de la cellule
+    continuations = [] # pour chaque cellule ouverte : continuation d'une fusion verticale ?
+    lignes = []        # pile des lignes ouvertes : textes des cellules déjà fermées
+    profondeur_fallback = 0
+
+    balises = [_NS_W + nom for nom in ("p", "tc", "tr", "t", "tab", "br", "cr", "vMerge")]
+    balises.append(_NS_MC + "Fallback")
+
+    for evenement, elem in etree.iterparse(flux, events=("start", "end"), tag=balises):
+        tag = elem.tag
+
+        if evenement == "start":
+            if tag == _NS_MC + "Fallback":
+                profondeur_fallback += 1
+            elif profondeur_fallback:
+                continue
+            elif tag == _NS_W + "p":
+                paragraphes.append([])
+            elif tag == _NS_W + "tc":
+                cellules.append([])
+                continuations.append(False)
+            elif tag == _NS_W + "tr":
+                lignes.append([])
+            continue
+
+        if tag == _NS_MC + "Fallback":
+            # Le rendu de repli duplique le contenu de mc:Choice
+            profondeur_fallback -= 1
+            elem.clear()
+            continue
+        if profondeur_fallback:
+            continue
+
+        if tag == _NS_W + "t":
+            if paragraphes:
+                paragraphes[-1].append(elem.text or "")
+        elif tag == _NS_W + "tab" and elem.getparent().tag == _NS_W + "r":
+            if paragraphes:
+                paragraphes[-1].append("\t")
+        elif tag in (_NS_W + "br", _NS_W + "cr"):
+            if paragraphes:
+                paragraphes[-1].append("\n")
+        elif tag == _NS_W + "vMerge":
+            # <w:vMerge/> sans val="restart" : cellule fusionnée avec celle du dessus
+            if continuations and elem.get(_NS_W + "val", "continue") != "restart":
+                continuations[-1] = True
+        elif tag == _NS_W + "p":
+            texte = "".join(paragraphes.pop())
+            if cellules:
+                cellules[-1].append(texte)
+            else:
+                yield texte
+        elif tag == _NS_W + "tc":
+            texte_cellule = "\n".join(cellules.pop())
+            if not continuations.pop():
+                lignes[-1].append(texte_cellule)
+        elif tag == _NS_W + "tr":
+            texte_ligne = " ".join(lignes.pop())
+            if cellules:
+                cellules[-1].append(texte_ligne)
+            else:
+                yield texte_ligne
+        else:
+            continue
+
+        # Libère les éléments déjà consommés : mémoire constante quelle que soit la taille
+        if tag in (_NS_W + "p", _NS_W + "tr"):
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None and parent.tag == _NS_W + "body":
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+def iterer_blocs_word(fichier_word) -> Iterator[str]:
+    """Produit les paragraphes et lignes de tableau d'un fichier Word dans l'ordre du corps"""
+    fichier_word.seek(0)
+    with zipfile.ZipFile(fichier_word) as archive:
+        with archive.open(_chemin_document_principal(archive)) as flux:
+            yield from _iterer_blocs_document_xml(flux)
+
+@avec_cache_extraction('word')
 def lire_fichier_word(fichier_word) -> str:
     """Extrait le texte d'un fichier Word"""
     try:
-        doc = Document(fichier_word)
-        texte = ""
-        
-        # Extraire le texte des paragraphes
-        for paragraph in doc.paragraphs:
-            texte += paragraph.text + "\n"
-        
-        # Extraire le texte des tableaux
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    texte += cell.text + " "
-                texte += "\n"
-        
-        return texte.strip()
+        return "\n".join(iterer_blocs_word(fichier_word)).strip()
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier Word : {str(e)}")
         return ""
 
-# === GÉNÉRATION DE PROMPTS ET APPELS OPENAI ===
+# === LECTURE CONCURRENTE DES DOCUMENTS ===
 
-def generer_prompt_optimisation(description_mission: str, dossier_competences: str) -> str:
-    """Génère le prompt pour optimiser le dossier de compétences selon la mission"""
+_pool_lecture = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lecture_documents")
+
+def lire_document(fichier, **options) -> str:
+    """Lit un document uploadé avec le lecteur correspondant à son extension"""
+    extension = fichier.name.split('.')[-1].lower()
+    if extension == 'pdf':
+        return lire_fichier_pdf(fichier, **options)
+    if extension == 'docx':
+        return lire_fichier_word(fichier)
+    return lire_fichier_txt(fichier)
+
+def soumettre_lecture(fonction: Callable, *args, **kwargs) -> Future:
+    """Exécute une lecture sur le pool partagé, dans le contexte Streamlit du rerun appelant
+
+    Le contexte est propagé pour que les st.error / placeholders appelés depuis le thread
+    de lecture s'affichent dans la page de la session, puis retiré à la fin de la tâche :
+    le thread du pool est réutilisé par d'autres sessions.
+    """
+    contexte = get_script_run_ctx()
+
+    def tache():
+        thread = threading.current_thread()
+        precedent = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+        if contexte is not None:
+            add_script_run_ctx(thread, contexte)
+        try:
+            return fonction(*args, **kwargs)
+        finally:
+            if precedent is None:
+                if hasattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME):
+                    delattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME)
+            else:
+                setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, precedent)
+
+    return _pool_lecture.submit(tache)
+
+# === SEGMENTATION DES DOSSIERS ===
+
+# Titres de section reconnus (ligne entière, comparée en minuscules, espaces normalisés)
+TITRES_SECTIONS_DOSSIER = [
+    ('experiences', r"exp[ée]riences?( professionnelles?)?|parcours professionnel|(professional|work) experiences?"),
+    ('formations', r"formations?|cursus( acad[ée]mique)?|dipl[ôo]mes?( et formations?)?|[ée]ducation|certifications?"),
+    ('competences', r"(domaines? de )?comp[ée]tences( \w+)?|connaissances( \w+)?|(technical )?skills"),
+    ('langues_hobbies', r"langues?|centres? d.int[ée]r[êe]ts?|loisirs|hobbies( (&|et) divers)?|divers"),
+    ('contact', r"contacts?|coordonn[ée]es|r[ée]f[ée]rences"),
+]
+_REGEX_TITRES_SECTIONS = [(type_section, re.compile(motif)) for type_section, motif in TITRES_SECTIONS_DOSSIER]
+
+# Sections transmises au modèle ; les coordonnées n'apportent rien à l'optimisation
+SECTIONS_UTILES_PROMPT = ('identite', 'experiences', 'formations', 'competences', 'langues_hobbies')
+
+NB_LIGNES_BORDURE_PAGE = 3
+LONGUEUR_MAX_TITRE_SECTION = 60
+CARACTERES_PAR_TOKEN = 4
+
+_REGEX_NUMERO_PAGE = re.compile(r"(page )?#+( ?(/|sur|of) ?#+)?|- ?#+ ?-")
+_REGEX_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_REGEX_URL = re.compile(r"https?://|www\.|linkedin\.com|github\.com", re.IGNORECASE)
+_REGEX_LIBELLE_TELEPHONE = re.compile(r"(t[ée]l[ée]?phone|t[ée]l|mobile|phone|portable)\s*:?\s*", re.IGNORECASE)
+# Numéro sans libellé : forme de téléphone, commençant par + ou 0
+_REGEX_TELEPHONE = re.compile(r"\(?[+0][\d()+.\-/\s]+")
+# Années ou périodes (« 2019 », « 2019 - 2021 », « 01/2019 - 12/2021 ») : jamais des téléphones
+_REGEX_PERIODE = re.compile(r"((0?[1-9]|1[0-2])/)?(19|20)\d\d([\s\-/–]+((0?[1-9]|1[0-2])/)?(19|20)\d\d)*")
+NB_CHIFFRES_MIN_TELEPHONE = 9
+
+def estimer_nombre_tokens(texte: str) -> int:
+    """Estimation du nombre de tokens (environ 4 caractères par token)"""
+    return -(-len(texte) // CARACTERES_PAR_TOKEN)
+
+def _normaliser_ligne(ligne: str) -> str:
+    return re.sub(r"\s+", " ", ligne).strip().lower()
+
+def _lignes_bordure_repetees(pages: List[str]) -> set:
+    """Lignes présentes en haut ou en bas d'au moins la moitié des pages (en-têtes, pieds de page)"""
+    if len(pages) < 2:
+        return set()
+
+    compteur = Counter()
+    for page in pages:
+        lignes = [_normaliser_ligne(l) for l in page.splitlines() if l.strip()]
+        bordure = lignes[:NB_LIGNES_BORDURE_PAGE] + lignes[-NB_LIGNES_BORDURE_PAGE:]
+        # Les numéros de page varient d'une page à l'autre : on compare les lignes sans chiffres
+        compteur.update({re.sub(r"\d", "#", l) for l in bordure})
+
+    seuil = max(2, (len(pages) + 1) // 2)
+    return {ligne for ligne, nb in compteur.items() if nb >= seuil}
+
+def _type_titre_section(ligne_normalisee: str) -> Optional[str]:
+    titre = ligne_normalisee.rstrip(" :")
+    if not titre or len(titre) > LONGUEUR_MAX_TITRE_SECTION:
+        return None
+    for type_section, regex in _REGEX_TITRES_SECTIONS:
+        if regex.fullmatch(titre):
+            return type_section
+    return None
+
+def _est_ligne_telephone(ligne: str) -> bool:
+    """Numéro de téléphone, avec libellé (tél, mobile...) ou en forme de numéro (+33..., 06...)"""
+    libelle = _REGEX_LIBELLE_TELEPHONE.match(ligne)
+    numero = ligne[libelle.end():] if libelle else ligne
+    if (_REGEX_PERIODE.fullmatch(numero) or not re.fullmatch(r"[\d()+.\-/\s]+", numero)
+            or sum(c.isdigit() for c in numero) < NB_CHIFFRES_MIN_TELEPHONE):
+        return False
+    return bool(libelle or _REGEX_TELEPHONE.fullmatch(numero))
+
+def _est_ligne_contact(ligne: str) -> bool:
+    ligne = ligne.strip()
+    return bool(_REGEX_EMAIL.search(ligne) or _REGEX_URL.search(ligne) or _est_ligne_telephone(ligne))
+
+def segmenter_dossier(texte: str) -> Dict[str, Any]:
+    """Découpe un dossier de compétences en sections typées, repérées par leurs positions
+
+    Retourne {'sections': [{'type', 'titre', 'debut', 'fin', 'lignes'}], 'lignes_ignorees': int}
+    où 'lignes' contient les (debut, fin) des lignes utiles de la section, hors en-têtes
+    et pieds de page répétés.
+    """
+    pages = texte.split(SEPARATEUR_PAGES)
+    bordures = _lignes_bordure_repetees(pages)
+    sections = [{'type': 'identite', 'titre': '', 'debut': 0, 'fin': 0, 'lignes': []}]
+    lignes_ignorees = 0
+
+    # Lignes non vides avec leur page : splitlines coupe aussi sur le saut de page,
+    # la ligne qui le porte est la dernière de sa page
+    lignes_non_vides = []
+    position = page = 0
+    for ligne in texte.splitlines(keepends=True):
+        debut, position = position, position + len(ligne)
+        normalisee = _normaliser_ligne(ligne)
+        if normalisee:
+            lignes_non_vides.append((debut, ligne, normalisee, page))
+        page += ligne.count(SEPARATEUR_PAGES)
+    nb_lignes_par_page = Counter(entree[3] for entree in lignes_non_vides)
+
+    rang = 0
+    for i, (debut, ligne, normalisee, page) in enumerate(lignes_non_vides):
+        rang = rang + 1 if i and lignes_non_vides[i - 1][3] == page else 0
+        nb_lignes_page = nb_lignes_par_page[page]
+        en_bordure = rang < NB_LIGNES_BORDURE_PAGE or rang >= nb_lignes_page - NB_LIGNES_BORDURE_PAGE
+        # Adjacente à un saut de page : première ou dernière ligne d'une page, dans un document multipage
+        contre_saut_page = len(pages) > 1 and (rang == 0 or rang == nb_lignes_page - 1)
+
+        # Une année seule (« 2019 ») est une date d'expérience ou de formation, jamais un numéro de page
+        sans_chiffres = re.sub(r"\d", "#", normalisee)
+        if not _REGEX_PERIODE.fullmatch(normalisee) and (
+                (en_bordure and sans_chiffres in bordures)
+                or (contre_saut_page and _REGEX_NUMERO_PAGE.fullmatch(sans_chiffres))):
+            lignes_ignorees += 1
+            continue
+
+        type_section = _type_titre_section(normalisee)
+        if type_section:
+            sections[-1]['fin'] = debut
+            titre = re.sub(r"\s+", " ", ligne).strip()
+            sections.append({'type': type_section, 'titre': titre, 'debut': debut, 'fin': debut, 'lignes': []})
+            continue
+
+        section = sections[-1]
+        if section['type'] in ('identite', 'contact') and _est_ligne_contact(ligne):
+            lignes_ignorees += 1
+            continue
+        section['lignes'].append((debut, debut + len(ligne.rstrip())))
+
+    sections[-1]['fin'] = len(texte)
+    return {'sections': sections, 'lignes_ignorees': lignes_ignorees}
+
+def _texte_section(texte: str, section: Dict[str, Any]) -> str:
+    """Lignes utiles d'une section de segmenter_dossier, précédées de son titre en majuscules"""
+    lignes = [re.sub(r"[ \t]+", " ", texte[debut:fin]).strip() for debut, fin in section['lignes']]
+    if section['titre']:
+        lignes.insert(0, section['titre'].upper())
+    return "\n".join(lignes)
+
+def extraire_sections_dossier(texte: str) -> Dict[str, str]:
+    """Texte de chaque type de section présent dans le dossier (sections de même type concaténées)"""
+    sections = {}
+    for section in segmenter_dossier(texte)['sections']:
+        if section['lignes']:
+            sections.setdefault(section['type'], []).append(_texte_section(texte, section))
+    return {type_section: "\n\n".join(blocs) for type_section, blocs in sections.items()}
+
+def preparer_dossier_pour_prompt(texte: str) -> Tuple[str, Dict[str, Any]]:
+    """Réduit un dossier aux sections utiles au modèle et mesure l'économie de tokens"""
+    segmentation = segmenter_dossier(texte)
+
+    blocs = [_texte_section(texte, section) for section in segmentation['sections']
+             if section['type'] in SECTIONS_UTILES_PROMPT and section['lignes']]
+    texte_condense = "\n\n".join(blocs)
+
+    tokens_avant = estimer_nombre_tokens(texte)
+    tokens_apres = estimer_nombre_tokens(texte_condense)
+    statistiques = {
+        'sections': [s['type'] for s in segmentation['sections'] if s['lignes']],
+        'lignes_ignorees': segmentation['lignes_ignorees'],
+        'tokens_avant': tokens_avant,
+        'tokens_apres': tokens_apres,
+        'tokens_economises': tokens_avant - tokens_apres,
+        'economie_pct': (tokens_avant - tokens_apres) / tokens_avant if tokens_avant else 0.0
+    }
+    return texte_condense, statistiques
+
+# === CACHE DES RÉPONSES OPENAI ===
+# La clé porte sur les prompts effectivement envoyés : toute modification des templates, de la
+# condensation du dossier ou de la taxonomie invalide d'elle-même les réponses en cache
+MODELE_OPENAI = "gpt-4o"
+TEMPERATURE_OPENAI = 0.3
+MAX_TOKENS_OPENAI = 4000
+# Appel unique en streaming, ou planification puis sections générées en parallèle
+MODE_GENERATION_UNIQUE = "unique"
+MODE_GENERATION_SECTIONS = "sections"
+
+CHEMIN_CACHE_REPONSES = os.environ.get("COMAI_CACHE_REPONSES", os.path.join(".cache_reponses", "reponses_openai.sqlite"))
+DUREE_VIE_REPONSES_H = 7 * 24
+TAILLE_MAX_CACHE_REPONSES_MB = 50
+
+class CacheReponses:
+    """Cache persistant (SQLite) des réponses du modèle, avec durée de vie et taille maximale
+
+    Les entrées expirées sont ignorées puis purgées ; au-delà de la taille maximale, les
+    entrées les moins récemment utilisées sont supprimées en premier.
+    """
+
+    def __init__(self, chemin: str, duree_vie_h: float, taille_max_mb: int):
+        self.chemin = chemin
+        self.duree_vie_s = duree_vie_h * 3600
+        self.taille_max = taille_max_mb * 1024 * 1024
+        self._connexion = None
+        self._verrou = threading.Lock()
+        self.compteurs = {'hits': 0, 'misses': 0, 'ecritures': 0, 'evictions': 0}
+
+    def _connecter(self) -> sqlite3.Connection:
+        """Ouverture paresseuse de la base, partagée par toutes les sessions (appelée sous verrou)"""
+        if self._connexion is None:
+            repertoire = os.path.dirname(self.chemin)
+            if repertoire:
+                os.makedirs(repertoire, exist_ok=True)
+            self._connexion = sqlite3.connect(self.chemin, check_same_thread=False)
+            self._connexion.execute(
+                "CREATE TABLE IF NOT EXISTS reponses ("
+                " cle TEXT PRIMARY KEY, contenu TEXT NOT NULL, modele TEXT,"
+                " cree_le REAL NOT NULL, dernier_acces REAL NOT NULL, taille INTEGER NOT NULL)"
+            )
+            self._connexion.execute("CREATE INDEX IF NOT EXISTS idx_dernier_acces ON reponses (dernier_acces)")
+        return self._connexion
+
+    def obtenir(self, cle: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Retourne (réponse, date de création) ou None si absente ou expirée"""
+        maintenant = time.time()
+        try:
+            with self._verrou:
+                connexion = self._connecter()
+                ligne = connexion.execute(
+                    "SELECT contenu, cree_le FROM reponses WHERE cle = ? AND cree_le >= ?",
+                    (cle, maintenant - self.duree_vie_s)
+                ).fetchone()
+                if ligne is None:
+                    self.compteurs['misses'] += 1
+                    return None
+                with connexion:
+                    connexion.execute("UPDATE reponses SET dernier_acces = ? WHERE cle = ?", (maintenant, cle))
+                self.compteurs['hits'] += 1
+            return json.loads(ligne[0]), ligne[1]
+        except (sqlite3.Error, OSError, ValueError):
+            # Le cache est facultatif : une base illisible équivaut à un miss
+            return None
+
+    def enregistrer(self, cle: str, reponse: Dict[str, Any], modele: str):
+        contenu = json.dumps(reponse, ensure_ascii=False)
+        maintenant = time.time()
+        try:
+            with self._verrou:
+                connexion = self._connecter()
+                with connexion:
+                    connexion.execute(
+                        "INSERT OR REPLACE INTO reponses VALUES (?, ?, ?, ?, ?, ?)",
+                        (cle, contenu, modele, maintenant, maintenant, len(contenu.encode('utf-8')))
+                    )
+                    self.compteurs['ecritures'] += 1
+                    self._evincer(connexion, maintenant)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _evincer(self, connexion: sqlite3.Connection, maintenant: float):
+        """Purge les entrées expirées puis les moins récemment utilisées au-delà de la taille max"""
+        supprimees = connexion.execute(
+            "DELETE FROM reponses WHERE cree_le < ?", (maintenant - self.duree_vie_s,)
+        ).rowcount
+        taille_totale = connexion.execute("SELECT COALESCE(SUM(taille), 0) FROM reponses").fetchone()[0]
+        if taille_totale > self.taille_max:
+            for cle, taille in connexion.execute(
+                "SELECT cle, taille FROM reponses ORDER BY dernier_acces"
+            ).fetchall():
+                if taille_totale <= self.taille_max:
+                    break
+                connexion.execute("DELETE FROM reponses WHERE cle = ?", (cle,))
+                taille_totale -= taille
+                supprimees += 1
+        self.compteurs['evictions'] += supprimees
+
+    def statistiques(self) -> Dict[str, Any]:
+        """Compteurs cumulés depuis le démarrage du processus et nombre d'entrées en base"""
+        with self._verrou:
+            stats = dict(self.compteurs)
+            try:
+                stats['entrees'] = self._connecter().execute("SELECT COUNT(*) FROM reponses").fetchone()[0]
+            except (sqlite3.Error, OSError):
+                stats['entrees'] = 0
+        return stats
+
+cache_reponses = CacheReponses(CHEMIN_CACHE_REPONSES, DUREE_VIE_REPONSES_H, TAILLE_MAX_CACHE_REPONSES_MB)
+
+def cle_cache_reponse(prompts: List[str], modele: str = MODELE_OPENAI, temperature: float = TEMPERATURE_OPENAI,
+                      max_tokens: int = MAX_TOKENS_OPENAI, mode: str = MODE_GENERATION_UNIQUE) -> str:
+    """Clé du cache : prompts envoyés au modèle (voir prompts_generation), paramètres et mode de génération"""
+    composantes = [
+        hashlib.sha256(MESSAGE_SYSTEME_OPENAI.encode('utf-8')).hexdigest(),
+        *(hashlib.sha256(prompt.encode('utf-8')).hexdigest() for prompt in prompts),
+        modele,
+        repr(temperature),
+        str(max_tokens),
+        mode,
+    ]
+    return hashlib.sha256("|".join(composantes).encode('utf-8')).hexdigest()
+
+# === ANALYSE JSON INCRÉMENTALE ===
+# Champs de premier niveau dont chaque élément est émis dès qu'il est complet
+CHAMPS_LISTE_PROGRESSIFS = ('experiences',)
+
+class AnalyseurJsonIncremental:
+    """Analyse un objet JSON reçu par fragments et émet chaque section dès sa fermeture
+
+    `alimenter(fragment)` retourne les événements (champ, index, valeur) devenus disponibles :
+    index vaut None pour un champ de premier niveau complet, sinon c'est la position d'un
+    élément d'une liste de CHAMPS_LISTE_PROGRESSIFS. Le texte précédant la première accolade
+    (balise ```json) et celui suivant la dernière sont ignorés.
+    """
+
+    def __init__(self, champs_liste: Tuple[str, ...] = CHAMPS_LISTE_PROGRESSIFS):
+        self.champs_liste = champs_liste
+        self.texte = ""
+        self.donnees: Dict[str, Any] = {}
+        self.termine = False
+        self._position = 0
+        self._profondeur = 0
+        self._dans_chaine = False
+        self._echappement = False
+        self._debut_cle = None
+        self._cle = None
+        self._debut_valeur = None
+        self._debut_element = None
+        self._nb_elements = 0
+
+    def alimenter(self, fragment: str) -> List[Tuple[str, Optional[int], Any]]:
+        self.texte += fragment
+        evenements = []
+        texte = self.texte
+        while self._position < len(texte) and not self.termine:
+            i = self._position
+            caractere = texte[i]
+            self._position += 1
+
+            if self._dans_chaine:
+                if self._echappement:
+                    self._echappement = False
+                elif caractere == '\\':
+                    self._echappement = True
+                elif caractere == '"':
+                    self._dans_chaine = False
+                continue
+
+            if self._profondeur == 0:
+                if caractere == '{':
+                    self._profondeur = 1
+                    self._debut_cle = i + 1
+                continue
+
+            if caractere == '"':
+                self._dans_chaine = True
+            elif caractere in '{[':
+                self._profondeur += 1
+                if (self._profondeur == 2 and caractere == '[' and self._cle in self.champs_liste):
+                    self._debut_element = i + 1
+                    self._nb_elements = 0
+            elif caractere in '}]':
+                if self._profondeur == 2 and self._debut_element is not None:
+                    self._emettre_element(i, evenements)
+                    self._debut_element = None
+                self._profondeur -= 1
+                if self._profondeur == 0:
+                    self._emettre_champ(i, evenements)
+                    self.termine = True
+            elif caractere == ',':
+                if self._profondeur == 1:
+                    self._emettre_champ(i, evenements)
+                    self._debut_cle = i + 1
+                elif self._profondeur == 2 and self._debut_element is not None:
+                    self._emettre_element(i, evenements)
+                    self._debut_element = i + 1
+            elif caractere == ':' and self._profondeur == 1 and self._cle is None:
+                self._cle = json.loads(texte[self._debut_cle:i])
+                self._debut_valeur = i + 1
+        return evenements
+
+    def _emettre_champ(self, fin: int, evenements: list):
+        if self._cle is None:
+            return
+        valeur = json.loads(self.texte[self._debut_valeur:fin])
+        self.donnees[self._cle] = valeur
+        evenements.append((self._cle, None, valeur))
+        self._cle = None
+
+    def _emettre_element(self, fin: int, evenements: list):
+        brut = self.texte[self._debut_element:fin]
+        if not brut.strip():
+            return
+        evenements.append((self._cle, self._nb_elements, json.loads(brut)))
+        self._nb_elements += 1
+
+def evenements_depuis_donnees(donnees: Dict[str, Any],
+                              champs_liste: Tuple[str, ...] = CHAMPS_LISTE_PROGRESSIFS
+                              ) -> Iterator[Tuple[str, Optional[int], Any]]:
+    """Rejoue, pour une réponse déjà complète (cache), les événements de l'analyse incrémentale"""
+    for champ, valeur in donnees.items():
+        if champ in champs_liste and isinstance(valeur, list):
+            for index, element in enumerate(valeur):
+                yield champ, index, element
+        yield champ, None, valeur
+
+# === COMPILATION DES PROMPTS ===
+# Seules les catégories des domaines détectés sont incluses dans les consignes (le catalogue
+# complet ne sert que si aucun domaine n'est détecté) ; les parties statiques rendues sont
+# mémorisées par instantané de taxonomie et jeu de domaines
+NB_PROMPTS_COMPILES_EN_CACHE = 64
+
+@functools.lru_cache(maxsize=NB_PROMPTS_COMPILES_EN_CACHE)
+def rendre_exemples_categories(taxonomie: TaxonomieCompilee, domaines: Tuple[str, ...] = ()) -> str:
+    """Exemples de catégories des domaines donnés, tirés de la taxonomie (tous les domaines si aucun)"""
+    domaines_connus = [d for d in domaines if d in taxonomie.categories_par_domaine]
+    blocs = []
+    for domaine in domaines_connus or taxonomie.categories_par_domaine:
+        categories = ", ".join(f'"{categorie}"' for categorie in taxonomie.categories_par_domaine[domaine])
+        blocs.append(f"**{domaine.upper()} :**\n- {categories}\n")
+    return "\n".join(blocs)
+
+def nouvelle_consommation() -> Dict[str, Any]:
+    """Compteurs de consommation d'une génération, alimentés par chaque requête au modèle"""
+    return {'requetes': 0, 'tokens_estimes': 0, 'tokens_factures': 0, 'premier_token_ms': None}
+
+# Cumul sur le processus, affiché avec les statistiques des caches
+statistiques_prompts = {'generations': 0, 'requetes': 0, 'tokens_estimes': 0, 'tokens_factures': 0,
+                        'tokens_economises': 0}
+
+def enregistrer_consommation(consommation: Optional[Dict[str, Any]], prompt: str, usage=None):
+    """Ajoute une requête : tokens d'entrée estimés localement, et facturés si l'API les renvoie"""
+    if consommation is None:
+        return
+    consommation['requetes'] += 1
+    consommation['tokens_estimes'] += estimer_nombre_tokens(MESSAGE_SYSTEME_OPENAI + prompt)
+    if usage is not None and getattr(usage, 'prompt_tokens', None):
+        consommation['tokens_factures'] += usage.prompt_tokens
+
+def afficher_consommation(consommation: Dict[str, Any], analyse_mission: AnalyseMission):
+    """Affiche les tokens d'entrée de la génération et l'économie due aux consignes ciblées"""
+    if not consommation['requetes']:
+        return
+    taxonomie = analyse_mission.taxonomie
+    economie = (estimer_nombre_tokens(rendre_exemples_categories(taxonomie))
+                - estimer_nombre_tokens(rendre_exemples_categories(
+                    taxonomie, tuple(domaine for domaine, _ in analyse_mission.domaines))))
+    statistiques_prompts['generations'] += 1
+    statistiques_prompts['tokens_economises'] += economie
+    for cle in ('requetes', 'tokens_estimes', 'tokens_factures'):
+        statistiques_prompts[cle] += consommation[cle]
     
-    prompt = f"""
-Tu es un expert RH spécialisé dans l'optimisation de dossiers de compétences pour des missions spécifiques.
+    tokens = consommation['tokens_factures'] or consommation['tokens_estimes']
+    details = [f"{consommation['requetes']} requête(s)", f"-{economie} tokens de consignes hors domaine"]
+    if consommation['premier_token_ms'] is not None:
+        details.append(f"premier token en {consommation['premier_token_ms']:.0f} ms")
+    st.caption(f"🧾 Prompt : {tokens} tokens en entrée"
+               f"{'' if consommation['tokens_factures'] else ' (estimés)'} · " + " · ".join(details))
 
-**MISSION À ANALYSER :**
-{description_mission}
+# === GÉNÉRATION DE PROMPTS ET APPELS OPENAI ===
 
-**DOSSIER DE COMPÉTENCES ACTUEL :**
-{dossier_competences}
+MESSAGE_SYSTEME_OPENAI = ("Tu es un expert RH spécialisé dans l'optimisation de dossiers de compétences. "
+                          "Réponds UNIQUEMENT avec un JSON valide, sans texte supplémentaire.")
+
+def generer_bloc_domaines(domaines: Optional[List[Tuple[str, float]]]) -> str:
+    """Bloc du prompt listant les domaines détectés et leur poids ; vide si aucun domaine"""
+    if not domaines:
+        return ""
+    lignes_domaines = "\n".join(f"- {domaine} ({poids:.0%})" for domaine, poids in domaines)
+    consigne = ("Mission hybride : fusionner les catégories de ces domaines, au prorata de leur poids."
+                if len(domaines) > 1 else "Utiliser les catégories de ce domaine.")
+    return f"""
+**DOMAINES DÉTECTÉS (poids relatif) :**
+{lignes_domaines}
+{consigne}
+"""
 
-**OBJECTIF :**
+# Consignes du prompt unique ; {exemples} reçoit les catégories des domaines détectés
+CONSIGNES_PROMPT_OPTIMISATION = """**OBJECTIF :**
 Adapter et optimiser le dossier de compétences pour qu'il soit parfaitement aligné avec la mission décrite, en mettant en valeur les compétences, expériences et qualités les plus pertinentes.
 
 **INSTRUCTIONS CRITIQUES :**
@@ -424,50 +2356,9 @@ Adapter et optimiser le dossier de compétences pour qu'il soit parfaitement ali
 
 **EXEMPLES DE CATÉGORIES SELON LES DOMAINES ET SPÉCIALISATIONS :**
 
-**DÉVELOPPEMENT & PROGRAMMATION :**
-- "Langages de programmation", "Frameworks", "Bases de données", "APIs & Services", "Outils de développement", "Méthodologies de dev"
-
-**DEVOPS & INFRASTRUCTURE :**
-- "Outils DevOps", "Cloud Computing", "Conteneurisation", "CI/CD", "Monitoring", "Infrastructure as Code"
-
-**CYBERSÉCURITÉ :**
-- "Sécurité réseau", "Outils de sécurité", "Audit & Conformité", "Gestion des risques", "Certifications sécurité", "Tests d'intrusion"
-
-**INTELLIGENCE ARTIFICIELLE & DATA :**
-- "Machine Learning", "Frameworks IA", "Data Engineering", "Analyse de données", "Outils IA", "Visualisation de données"
-
-**BUSINESS INTELLIGENCE & ANALYTICS :**
-- "Outils BI", "Reporting", "Data Warehousing", "Visualisation", "ETL", "Analyse prédictive"
-
-**ARCHITECTURE & SYSTÈMES :**
-- "Architecture logicielle", "Systèmes distribués", "Microservices", "Patterns de conception", "Performance", "Scalabilité"
-
-**MARKETING DIGITAL :**
-- "Outils marketing", "Analytics", "Réseaux sociaux", "CRM", "Design graphique", "SEO/SEM"
-
-**FINANCE :**
-- "Logiciels financiers", "Réglementation", "Analyse de données", "Reporting", "Certification", "Risk Management"
-
-**RESSOURCES HUMAINES :**
-- "SIRH", "Recrutement", "Formation", "Paie", "Droit social", "Talent Management"
-
-**LOGISTIQUE & SUPPLY CHAIN :**
-- "Supply Chain", "Systèmes WMS", "Transport", "Réglementation", "Optimisation", "Procurement"
-
-**CONSULTING & STRATÉGIE :**
-- "Méthodologies conseil", "Analyse stratégique", "Conduite du changement", "Gestion de projet", "Secteurs d'expertise", "Outils d'analyse"
-
-**SANTÉ & MÉDICAL :**
-- "Systèmes médicaux", "Réglementation santé", "Dispositifs médicaux", "Informatique médicale", "Qualité santé", "Recherche clinique"
-
-**ÉDUCATION & FORMATION :**
-- "Pédagogie", "Outils e-learning", "Conception pédagogique", "Évaluation", "Technologies éducatives", "Ingénierie de formation"
-
-**JURIDIQUE & COMPLIANCE :**
-- "Droit des affaires", "Compliance", "Réglementation", "Contentieux", "Propriété intellectuelle", "Outils juridiques"
-
+{exemples}
 **FORMAT DE SORTIE OBLIGATOIRE - JSON STRICT :**
-{{
+{
   "nom_consultant": "Nom complet du consultant",
   "titre_du_poste": "Titre optimisé pour la mission",
   "points_forts": [
@@ -486,24 +2377,24 @@ Adapter et optimiser le dossier de compétences pour qu'il soit parfaitement ali
     "Niveau 5 correspondant à la mission"
   ],
   "formations": [
-    {{
+    {
       "annee": "YYYY",
       "intitule": "Formation pertinente pour la mission"
-    }}
+    }
   ],
-  "connaissances": {{
+  "connaissances": {
     "Catégorie 1 adaptée à la spécialisation": "Compétences spécifiques extraites du dossier",
     "Catégorie 2 adaptée à la spécialisation": "Compétences spécifiques extraites du dossier",
     "Catégorie 3 adaptée à la spécialisation": "Compétences spécifiques extraites du dossier",
     "Catégorie 4 adaptée à la spécialisation": "Compétences spécifiques extraites du dossier",
     "Catégorie 5 adaptée à la spécialisation": "Compétences spécifiques extraites du dossier"
-  }},
-  "hobbies_divers": {{
+  },
+  "hobbies_divers": {
     "langues": "Langues maîtrisées",
     "hobbies": "Hobbies valorisant le profil"
-  }},
+  },
   "experiences": [
-    {{
+    {
       "periode": "Période de l'expérience",
       "titre": "Titre optimisé pour la mission",
       "entreprise": "Nom de l'entreprise",
@@ -521,9 +2412,9 @@ Adapter et optimiser le dossier de compétences pour qu'il soit parfaitement ali
         "Réalisation 10 alignée avec la mission"
       ],
       "environnement": "Environnement technique pertinent"
-    }}
+    }
   ]
-}}
+}
 
 **RÈGLES IMPORTANTES :**
 - Utilise UNIQUEMENT les informations réelles du dossier original
@@ -539,57 +2430,439 @@ Adapter et optimiser le dossier de compétences pour qu'il soit parfaitement ali
 - Génère le maximum de 10 réalisations par experiences 
 - Adapter les catégories de compétences si le profil couvre plusieurs domaines (ex: DevSecOps = DevOps + Sécurité)
 """
+
+@functools.lru_cache(maxsize=NB_PROMPTS_COMPILES_EN_CACHE)
+def _consignes_prompt_optimisation(taxonomie: TaxonomieCompilee, domaines: Tuple[str, ...]) -> str:
+    """Partie statique du prompt (objectif, instructions, exemples, format, règles) pour un jeu de domaines"""
+    return CONSIGNES_PROMPT_OPTIMISATION.replace("{exemples}", rendre_exemples_categories(taxonomie, domaines))
+
+def generer_prompt_optimisation(description_mission: str, dossier_competences: str,
+                                domaines: Optional[List[Tuple[str, float]]] = None,
+                                taxonomie: Optional[TaxonomieCompilee] = None) -> str:
+    """Génère le prompt pour optimiser le dossier de compétences selon la mission"""
+    
+    taxonomie = taxonomie or obtenir_taxonomie()
+    bloc_domaines = generer_bloc_domaines(domaines)
+    consignes = _consignes_prompt_optimisation(taxonomie, tuple(domaine for domaine, _ in domaines or ()))
+    
+    prompt = f"""
+Tu es un expert RH spécialisé dans l'optimisation de dossiers de compétences pour des missions spécifiques.
+
+**MISSION À ANALYSER :**
+{description_mission}
+{bloc_domaines}
+**DOSSIER DE COMPÉTENCES ACTUEL :**
+{dossier_competences}
+
+{consignes}"""
     
     return prompt
 
-def appeler_openai_pour_optimisation(description_mission: str, dossier_competences: str) -> Optional[Dict[Any, Any]]:
-    """Appelle l'API OpenAI pour optimiser le dossier de compétences"""
+def generer_en_streaming(client: OpenAI, prompt: str,
+                         rappel_section: Optional[Callable[[str, Optional[int], Any], None]] = None,
+                         consommation: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Appel unique en streaming, analysé au fil de l'eau ; None (avec message) si le JSON est invalide"""
+    flux = client.chat.completions.create(
+        model=MODELE_OPENAI,
+        messages=[
+            {
+                "role": "system", 
+                "content": MESSAGE_SYSTEME_OPENAI
+            },
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ],
+        temperature=TEMPERATURE_OPENAI,
+        max_tokens=MAX_TOKENS_OPENAI,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    
+    # Les balises ```json éventuelles sont ignorées par l'analyseur
+    analyseur = AnalyseurJsonIncremental()
+    debut = time.perf_counter()
+    usage = None
+    try:
+        for morceau in flux:
+            # Le dernier morceau ne porte que la consommation de la requête
+            usage = getattr(morceau, 'usage', None) or usage
+            if not morceau.choices or not morceau.choices[0].delta.content:
+                continue
+            if consommation is not None and consommation['premier_token_ms'] is None:
+                consommation['premier_token_ms'] = (time.perf_counter() - debut) * 1000
+            for champ, index, valeur in analyseur.alimenter(morceau.choices[0].delta.content):
+                if rappel_section:
+                    rappel_section(champ, index, valeur)
+    except json.JSONDecodeError as e:
+        st.error(f"Erreur de parsing JSON : {e}")
+        st.text("Réponse brute reçue :")
+        st.text(analyseur.texte[:500] + "..." if len(analyseur.texte) > 500 else analyseur.texte)
+        return None
+    
+    if not analyseur.termine:
+        st.error("Erreur de parsing JSON : réponse incomplète (limite de tokens atteinte ?)")
+        st.text("Fin de la réponse reçue :")
+        st.text("..." + analyseur.texte[-500:] if len(analyseur.texte) > 500 else analyseur.texte)
+        return None
+    enregistrer_consommation(consommation, prompt, usage)
+    return analyseur.donnees
+
+# === GÉNÉRATION PARALLÈLE PAR SECTIONS ===
+# Un appel de planification court (identité, titre, expériences retenues), puis un appel par
+# section et par expérience, exécutés simultanément : la latence est celle de la section la plus
+# longue, et chaque expérience dispose de son propre budget de tokens. Seule la planification reçoit
+# la mission et le dossier complets : chaque autre appel ne reçoit qu'un résumé de la mission et
+# l'extrait du dossier qu'il rédige, pour que les tokens d'entrée ne soient pas multipliés par le
+# nombre d'appels
+NB_APPELS_SIMULTANES_OPENAI = 6
+MAX_TOKENS_PLAN = 1000
+MAX_TOKENS_SECTION = 1500
+
+# Section -> (champs produits, consigne, format JSON attendu)
+SECTIONS_DOSSIER = {
+    'profil': (
+        ('points_forts', 'niveaux_intervention'),
+        "Rédige 6 points forts et 5 niveaux d'intervention du consultant, alignés avec la mission.",
+        '{"points_forts": ["Point fort adapté à la mission"], '
+        '"niveaux_intervention": ["Niveau correspondant à la mission"]}'
+    ),
+    'formations': (
+        ('formations',),
+        "Liste les formations et certifications du dossier pertinentes pour la mission.",
+        '{"formations": [{"annee": "YYYY", "intitule": "Formation pertinente pour la mission"}]}'
+    ),
+    'connaissances': (
+        ('connaissances',),
+        "Regroupe les compétences réelles du dossier dans le maximum de catégories pertinentes pour "
+        "la spécialisation de la mission.\n\n**EXEMPLES DE CATÉGORIES :**\n{exemples}",
+        '{"connaissances": {"Catégorie adaptée à la spécialisation": "Compétences extraites du dossier"}}'
+    ),
+    'hobbies_divers': (
+        ('hobbies_divers',),
+        "Indique les langues maîtrisées et les hobbies valorisant le profil.",
+        '{"hobbies_divers": {"langues": "Langues maîtrisées", "hobbies": "Hobbies valorisant le profil"}}'
+    ),
+}
+# Section -> sections du dossier (voir TITRES_SECTIONS_DOSSIER) transmises à son appel ;
+# le dossier complet est transmis si aucune n'a été repérée
+SOURCES_SECTIONS_DOSSIER = {
+    'profil': ('identite', 'competences'),
+    'formations': ('formations',),
+    'connaissances': ('competences',),
+    'hobbies_divers': ('langues_hobbies', 'competences'),
+}
+LONGUEUR_MAX_RESUME_MISSION = 800
+NB_COMPETENCES_RESUME_MISSION = 12
+LONGUEUR_MAX_ENTETE_EXPERIENCE = 150
+# Avance minimale (en mots d'en-tête communs) sur l'entrée suivante, sans l'entreprise en commun
+ECART_MIN_SCORE_EXPERIENCE = 2
+# Ligne d'en-tête d'une expérience : une période (« 2019 - 2021 », « Juin 2023 – présent », « Novembre2024 »)
+_REGEX_PERIODE_EXPERIENCE = re.compile(
+    r"(19|20)\d\d\s*[-–à]+\s*((19|20)\d\d|pr[ée]sent|aujourd|ce jour|en cours|now|current)"
+    r"|\b(janv|f[ée]vr?|mars|avr|mai|juin|juil|ao[uû]t|sept?|oct|nov|d[ée]c|jan|feb|apr|may|jun|jul|aug|dec)"
+    r"[a-zéû]*\.?\s*(19|20)\d\d",
+    re.IGNORECASE)
+
+def resumer_mission(description_mission: str, analyse_mission: AnalyseMission) -> str:
+    """Début de la mission et compétences attendues par niveau d'exigence, pour les appels de section"""
+    extrait = "\n".join(" ".join(ligne.split()) for ligne in description_mission.splitlines() if ligne.strip())
+    if len(extrait) > LONGUEUR_MAX_RESUME_MISSION:
+        extrait = extrait[:LONGUEUR_MAX_RESUME_MISSION].rsplit(None, 1)[0] + " [...]"
+
+    par_exigence = {}
+    for competence, detail in analyse_mission.competences.items():
+        par_exigence.setdefault(detail['exigence'], []).append(competence)
+    lignes = [f"- {exigence.capitalize()} : {', '.join(par_exigence[exigence][:NB_COMPETENCES_RESUME_MISSION])}"
+              for exigence in POIDS_EXIGENCE if exigence in par_exigence]
+    if lignes:
+        extrait += "\n\nCompétences attendues :\n" + "\n".join(lignes)
+    return extrait
+
+def extrait_dossier_section(section: str, sections_dossier: Dict[str, str], dossier_competences: str) -> str:
+    """Sections du dossier utiles à une section générée (voir SOURCES_SECTIONS_DOSSIER)"""
+    blocs = [sections_dossier[source] for source in SOURCES_SECTIONS_DOSSIER[section] if source in sections_dossier]
+    return "\n\n".join(blocs) if blocs else dossier_competences
+
+def decouper_experiences(texte_experiences: str) -> List[str]:
+    """Découpe la section expériences en une entrée par expérience, à chaque ligne d'en-tête datée"""
+    blocs = [[]]
+    for ligne in texte_experiences.splitlines():
+        est_entete = (ligne[:1].isalnum() and len(ligne) <= LONGUEUR_MAX_ENTETE_EXPERIENCE
+                      and _REGEX_PERIODE_EXPERIENCE.search(ligne))
+        if est_entete and any(blocs[-1]):
+            blocs.append([])
+        blocs[-1].append(ligne)
+    return ["\n".join(bloc) for bloc in blocs if any(bloc)]
+
+def _mots_reperes(texte: str) -> set:
+    return set(re.findall(r"\w{3,}", normaliser_texte(texte)))
+
+def extrait_dossier_experience(experience: Dict[str, Any], experiences_dossier: List[str],
+                               dossier_competences: str) -> str:
+    """Entrée du dossier correspondant à une expérience retenue par la planification
+
+    L'entrée retenue est celle dont l'en-tête partage le plus de mots avec la période, le titre et
+    l'entreprise de l'expérience, à condition d'en partager l'entreprise ou de devancer nettement
+    l'entrée suivante : une année commune à deux postes consécutifs ne suffit pas. À défaut, toute
+    la section expériences (ou le dossier) est transmise.
+    """
+    entreprise = _mots_reperes(str(experience.get('entreprise', '')))
+    reperes = entreprise | _mots_reperes(
+        " ".join(str(experience.get(champ, '')) for champ in ('periode', 'titre')))
+    classement = []
+    for bloc in experiences_dossier:
+        entete = _mots_reperes(" ".join(bloc.splitlines()[:3]))
+        classement.append((len(reperes & entete), bool(entreprise & entete), bloc))
+    classement.sort(key=lambda entree: entree[:2], reverse=True)
+
+    if classement and classement[0][0]:
+        score, entreprise_commune, bloc = classement[0]
+        score_suivant = classement[1][0] if len(classement) > 1 else 0
+        if entreprise_commune or score >= score_suivant + ECART_MIN_SCORE_EXPERIENCE:
+            return bloc
+    return "\n\n".join(experiences_dossier) or dossier_competences
+
+# Ordre des clés du dossier fusionné, identique à celui du prompt unique
+ORDRE_CHAMPS_DOSSIER = ('nom_consultant', 'titre_du_poste', 'points_forts', 'niveaux_intervention',
+                        'formations', 'connaissances', 'hobbies_divers', 'experiences')
+
+def _contexte_prompt_section(description_mission: str, dossier_competences: str,
+                             domaines: Optional[List[Tuple[str, float]]], extrait: bool = True) -> str:
+    """Partie commune aux prompts de planification (mission et dossier complets) et de section (extraits)"""
+    titre_mission, titre_dossier = (("RÉSUMÉ DE LA MISSION", "EXTRAIT DU DOSSIER DE COMPÉTENCES") if extrait
+                                    else ("MISSION À ANALYSER", "DOSSIER DE COMPÉTENCES ACTUEL"))
+    return f"""
+**{titre_mission} :**
+{description_mission}
+{generer_bloc_domaines(domaines)}
+**{titre_dossier} :**
+{dossier_competences}
+
+**RÈGLES IMPORTANTES :**
+- Utilise UNIQUEMENT les informations réelles du dossier original, n'invente AUCUNE information
+- Reformule et priorise les éléments ayant un lien démontrable avec la mission
+- Réponds avec un JSON strict, au format demandé
+"""
+
+def generer_prompt_plan(description_mission: str, dossier_competences: str,
+                        domaines: Optional[List[Tuple[str, float]]] = None) -> str:
+    """Prompt de planification : identité du consultant et expériences à conserver"""
+    return _contexte_prompt_section(description_mission, dossier_competences, domaines, extrait=False) + """
+**TÂCHE :**
+Identifie le consultant, propose un titre de poste optimisé pour la mission et liste les expériences
+du dossier à conserver, de la plus pertinente à la moins pertinente. Exclus les expériences sans lien avec la mission.
+
+**FORMAT :**
+{"nom_consultant": "Nom complet du consultant", "titre_du_poste": "Titre optimisé pour la mission",
+ "experiences": [{"periode": "Période de l'expérience", "titre": "Titre d'origine", "entreprise": "Nom de l'entreprise"}]}
+"""
+
+def generer_prompt_section(section: str, resume_mission: str, extrait_dossier: str,
+                           plan: Dict[str, Any], domaines: Optional[List[Tuple[str, float]]] = None,
+                           taxonomie: Optional[TaxonomieCompilee] = None) -> str:
+    """Prompt d'une section du dossier (voir SECTIONS_DOSSIER), sur le résumé de la mission et l'extrait utile"""
+    _, consigne, format_json = SECTIONS_DOSSIER[section]
+    if "{exemples}" in consigne:
+        exemples = rendre_exemples_categories(taxonomie or obtenir_taxonomie(),
+                                              tuple(domaine for domaine, _ in domaines or ()))
+        consigne = consigne.replace("{exemples}", exemples)
+    return _contexte_prompt_section(resume_mission, extrait_dossier, domaines) + f"""
+**CONSULTANT :** {plan.get('nom_consultant', '')} - {plan.get('titre_du_poste', '')}
+
+**TÂCHE :**
+{consigne}
+
+**FORMAT :**
+{format_json}
+"""
+
+def generer_prompt_experience(experience: Dict[str, Any], resume_mission: str, extrait_dossier: str,
+                              plan: Dict[str, Any], domaines: Optional[List[Tuple[str, float]]] = None) -> str:
+    """Prompt de réécriture d'une expérience retenue par la planification, sur son seul extrait du dossier"""
+    return _contexte_prompt_section(resume_mission, extrait_dossier, domaines) + f"""
+**CONSULTANT :** {plan.get('nom_consultant', '')} - {plan.get('titre_du_poste', '')}
+
+**TÂCHE :**
+Réécris uniquement l'expérience suivante de l'extrait pour la mission, avec jusqu'à 10 réalisations :
+{experience.get('periode', '')} - {experience.get('titre', '')} - {experience.get('entreprise', '')}
+
+**FORMAT :**
+{{"periode": "Période de l'expérience", "titre": "Titre optimisé pour la mission",
+ "entreprise": "Nom de l'entreprise", "responsabilites": "Responsabilités adaptées et détaillées pour la mission",
+ "realisations": ["Réalisation alignée avec la mission"], "environnement": "Environnement technique pertinent"}}
+"""
+
+async def _appeler_openai_json(client: AsyncOpenAI, semaphore: asyncio.Semaphore, prompt: str,
+                               max_tokens: int, consommation: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Un appel de la génération par sections, borné par le sémaphore partagé"""
+    async with semaphore:
+        reponse = await client.chat.completions.create(
+            model=MODELE_OPENAI,
+            messages=[
+                {"role": "system", "content": MESSAGE_SYSTEME_OPENAI},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=TEMPERATURE_OPENAI,
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"}
+        )
+    enregistrer_consommation(consommation, prompt, reponse.usage)
+    return json.loads(reponse.choices[0].message.content)
+
+def generer_par_sections(client: AsyncOpenAI, description_mission: str, dossier_competences: str,
+                         domaines: Optional[List[Tuple[str, float]]] = None,
+                         rappel_section: Optional[Callable[[str, Optional[int], Any], None]] = None,
+                         taxonomie: Optional[TaxonomieCompilee] = None,
+                         consommation: Optional[Dict[str, Any]] = None,
+                         analyse_mission: Optional[AnalyseMission] = None) -> Dict[str, Any]:
+    """Planification puis génération simultanée des sections et expériences, fusionnées au format du prompt unique
+
+    Les appels s'exécutent sur la boucle OpenAI partagée ; les résultats sont consommés ici,
+    dans le thread appelant, à mesure qu'ils arrivent (rappel_section comme en streaming).
+    Hors planification, chaque appel ne reçoit que le résumé de la mission et son extrait du dossier.
+    """
+    analyse_mission = analyse_mission or analyser_mission(description_mission, taxonomie)
+    resume_mission = resumer_mission(description_mission, analyse_mission)
+    sections_dossier = extraire_sections_dossier(dossier_competences)
+    experiences_dossier = decouper_experiences(sections_dossier.get('experiences', ''))
+    
+    semaphore = asyncio.Semaphore(NB_APPELS_SIMULTANES_OPENAI)
+    prompt_plan = generer_prompt_plan(description_mission, dossier_competences, domaines)
+    plan = executer_sur_boucle_openai(
+        _appeler_openai_json(client, semaphore, prompt_plan, MAX_TOKENS_PLAN, consommation)
+    ).result()
+    
+    resultats = {champ: plan.get(champ, '') for champ in ('nom_consultant', 'titre_du_poste')}
+    if rappel_section:
+        for champ, valeur in resultats.items():
+            rappel_section(champ, None, valeur)
+    
+    def lancer(prompt):
+        return executer_sur_boucle_openai(
+            _appeler_openai_json(client, semaphore, prompt, MAX_TOKENS_SECTION, consommation)
+        )
+    
+    futurs = {}
+    for section in SECTIONS_DOSSIER:
+        extrait = extrait_dossier_section(section, sections_dossier, dossier_competences)
+        prompt = generer_prompt_section(section, resume_mission, extrait, plan, domaines, taxonomie)
+        futurs[lancer(prompt)] = (section, None)
+    experiences_retenues = plan.get('experiences', [])
+    for index, experience in enumerate(experiences_retenues):
+        extrait = extrait_dossier_experience(experience, experiences_dossier, dossier_competences)
+        prompt = generer_prompt_experience(experience, resume_mission, extrait, plan, domaines)
+        futurs[lancer(prompt)] = ('experiences', index)
+    
+    experiences = [None] * len(experiences_retenues)
+    try:
+        for futur in as_completed(futurs):
+            section, index = futurs[futur]
+            valeur = futur.result()
+            if section == 'experiences':
+                experiences[index] = valeur
+                if rappel_section:
+                    rappel_section(section, index, valeur)
+                continue
+            for champ in SECTIONS_DOSSIER[section][0]:
+                if champ in valeur:
+                    resultats[champ] = valeur[champ]
+                    if rappel_section:
+                        rappel_section(champ, None, valeur[champ])
+    except Exception:
+        # Un appel en échec : inutile d'attendre (et de payer) les autres
+        for futur in futurs:
+            futur.cancel()
+        raise
+    
+    resultats['experiences'] = experiences
+    if rappel_section:
+        rappel_section('experiences', None, experiences)
+    return {champ: resultats[champ] for champ in ORDRE_CHAMPS_DOSSIER if champ in resultats}
+
+def prompts_generation(description_mission: str, dossier_condense: str, analyse_mission: AnalyseMission,
+                       mode: str = MODE_GENERATION_UNIQUE) -> List[str]:
+    """Prompts qu'une génération enverra au modèle, pour la clé du cache des réponses
+
+    En mode sections, les prompts de section et d'expérience dépendent de la réponse de
+    planification : ils sont rendus avec un plan vide, ce qui couvre leurs templates, le résumé
+    de la mission et chaque extrait du dossier.
+    """
+    domaines, taxonomie = analyse_mission.domaines, analyse_mission.taxonomie
+    if mode != MODE_GENERATION_SECTIONS:
+        return [generer_prompt_optimisation(description_mission, dossier_condense, domaines, taxonomie)]
+
+    resume_mission = resumer_mission(description_mission, analyse_mission)
+    sections_dossier = extraire_sections_dossier(dossier_condense)
+    prompts = [generer_prompt_plan(description_mission, dossier_condense, domaines)]
+    prompts += [generer_prompt_section(section, resume_mission,
+                                       extrait_dossier_section(section, sections_dossier, dossier_condense),
+                                       {}, domaines, taxonomie)
+                for section in SECTIONS_DOSSIER]
+    prompts += [generer_prompt_experience({}, resume_mission, extrait, {}, domaines)
+                for extrait in decouper_experiences(sections_dossier.get('experiences', ''))]
+    return prompts
+
+def appeler_openai_pour_optimisation(description_mission: str, dossier_competences: str,
+                                     analyse_mission: Optional[AnalyseMission] = None,
+                                     forcer_regeneration: bool = False,
+                                     rappel_section: Optional[Callable[[str, Optional[int], Any], None]] = None,
+                                     mode: str = MODE_GENERATION_UNIQUE) -> Optional[Dict[Any, Any]]:
+    """Appelle l'API OpenAI pour optimiser le dossier de compétences
+
+    `rappel_section(champ, index, valeur)` est appelé dès qu'un champ de premier niveau (index None)
+    ou une expérience (index dans la liste) est disponible : au fil du streaming en mode unique, à
+    l'arrivée de chaque appel en mode sections. Une réponse reprise du cache rejoue les mêmes appels.
+    """
     
-    client = configurer_openai()
+    analyse_mission = analyse_mission or analyser_mission(description_mission)
+    dossier_condense, stats_condensation = preparer_dossier_pour_prompt(dossier_competences)
+    prompts = prompts_generation(description_mission, dossier_condense, analyse_mission, mode)
+    cle_cache = cle_cache_reponse(prompts, mode=mode)
+    if not forcer_regeneration:
+        en_cache = cache_reponses.obtenir(cle_cache)
+        if en_cache is not None:
+            donnees_optimisees, cree_le = en_cache
+            date_generation = datetime.datetime.fromtimestamp(cree_le).strftime('%d/%m/%Y %H:%M')
+            st.caption(f"⚡ Réponse reprise du cache (générée le {date_generation}) - aucun appel OpenAI")
+            if rappel_section:
+                for champ, index, valeur in evenements_depuis_donnees(donnees_optimisees):
+                    rappel_section(champ, index, valeur)
+            return donnees_optimisees
+    
+    client = configurer_openai(asynchrone=(mode == MODE_GENERATION_SECTIONS))
     if not client:
         return None
     
     try:
-        prompt = generer_prompt_optimisation(description_mission, dossier_competences)
-        
-        with st.spinner("🤖 Analyse intelligente en cours avec OpenAI..."):
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Tu es un expert RH spécialisé dans l'optimisation de dossiers de compétences. Réponds UNIQUEMENT avec un JSON valide, sans texte supplémentaire."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=4000
-            )
-            
-            contenu_reponse = response.choices[0].message.content.strip()
-            
-            # Nettoyer la réponse pour extraire le JSON
-            if contenu_reponse.startswith("```json"):
-                contenu_reponse = contenu_reponse[7:-3].strip()
-            elif contenu_reponse.startswith("```"):
-                contenu_reponse = contenu_reponse[3:-3].strip()
-            
-            # Parser le JSON
-            try:
-                donnees_optimisees = json.loads(contenu_reponse)
-                return donnees_optimisees
-            except json.JSONDecodeError as e:
-                st.error(f"Erreur de parsing JSON : {e}")
-                st.text("Réponse brute reçue :")
-                st.text(contenu_reponse[:500] + "..." if len(contenu_reponse) > 500 else contenu_reponse)
-                return None
+        st.caption(
+            f"✂️ Dossier condensé pour le modèle : {stats_condensation['tokens_avant']} → "
+            f"{stats_condensation['tokens_apres']} tokens estimés "
+            f"(-{stats_condensation['economie_pct']:.0%}, {stats_condensation['lignes_ignorees']} lignes ignorées)"
+        )
+        
+        consommation = nouvelle_consommation()
+        if mode == MODE_GENERATION_SECTIONS:
+            with st.spinner("🤖 Génération des sections en parallèle avec OpenAI..."):
+                donnees_optimisees = generer_par_sections(client, description_mission, dossier_condense,
+                                                          analyse_mission.domaines, rappel_section,
+                                                          analyse_mission.taxonomie, consommation,
+                                                          analyse_mission)
+        else:
+            with st.spinner("🤖 Analyse intelligente en cours avec OpenAI..."):
+                donnees_optimisees = generer_en_streaming(client, prompts[0], rappel_section, consommation)
+        afficher_consommation(consommation, analyse_mission)
+        
+        if donnees_optimisees is None:
+            return None
+        cache_reponses.enregistrer(cle_cache, donnees_optimisees, MODELE_OPENAI)
+        return donnees_optimisees
                 
     except Exception as e:
         st.error(f"Erreur lors de l'appel à OpenAI : {str(e)}")
         return None
+
 # === EXTRACTION DE DONNÉES JSON ===
 
 def extraire_contenu_json(reponse_ia):
@@ -2407,8 +4680,8 @@ def generer_cv_depuis_template_avec_entete_preserve(template_file, data):
     Version qui préserve tout le contenu du template
     """
     try:
-        # Charger le document SANS modification
-        doc = Document(template_file)
+        # Charger le document SANS modification (ou reprendre celui préchargé pendant le streaming)
+        doc = template_file if hasattr(template_file, 'paragraphs') else Document(template_file)
         
         # D'abord remplir les placeholders normalement
         remplacer_placeholders(doc, data)
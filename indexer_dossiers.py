@@ -0,0 +1,128 @@
+# indexer_dossiers.py - Indexation hors ligne de la bibliothèque de dossiers consultants
+#
+# Produit pour chaque dossier PDF/DOCX un sidecar JSON compact (texte extrait, rapport
+# d'extraction, empreinte du contenu) que les lecteurs de cv_functions chargent directement
+# quand un consultant réutilise le même dossier. Les analyses (sections, compétences) restent
+# calculées à la lecture : elles dépendent de la taxonomie, modifiable à chaud.
+#
+# Usage : python indexer_dossiers.py <répertoire des dossiers> [--sortie index_dossiers] [--forcer]
+
+import argparse
+import datetime
+import io
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Optional
+
+import cv_functions
+
+LECTEURS_PAR_EXTENSION = {
+    '.pdf': ('pdf', cv_functions.lire_fichier_pdf),
+    '.docx': ('word', cv_functions.lire_fichier_word),
+}
+
+
+def construire_sidecar(chemin: str) -> Optional[Dict[str, Any]]:
+    """Extrait un dossier ; retourne None si le format n'est pas pris en charge"""
+    extension = os.path.splitext(chemin)[1].lower()
+    if extension not in LECTEURS_PAR_EXTENSION:
+        return None
+    type_lecteur, lecteur = LECTEURS_PAR_EXTENSION[extension]
+
+    with open(chemin, 'rb') as f:
+        fichier = io.BytesIO(f.read())
+    empreinte = cv_functions.calculer_empreinte_fichier(fichier)
+
+    # Appel direct du lecteur (sans le cache) pour toujours indexer une extraction fraîche
+    rapport = {}
+    if type_lecteur == 'pdf':
+        texte = lecteur.__wrapped__(fichier, rapport=rapport)
+    else:
+        texte = lecteur.__wrapped__(fichier)
+    if not texte:
+        return None
+
+    return {
+        'version_format': cv_functions.VERSION_FORMAT_SIDECAR,
+        'empreinte': empreinte,
+        'lecteur': type_lecteur,
+        'version_lecteur': cv_functions.VERSIONS_LECTEURS[type_lecteur],
+        'fichier': os.path.basename(chemin),
+        'indexe_le': datetime.datetime.now().isoformat(timespec='seconds'),
+        'texte': texte,
+        'rapport': rapport,
+    }
+
+
+def ecrire_sidecar(sidecar: Dict[str, Any], repertoire: str) -> str:
+    """Écrit le sidecar de façon atomique dans le répertoire d'index"""
+    os.makedirs(repertoire, exist_ok=True)
+    chemin = cv_functions.chemin_sidecar(sidecar['empreinte'], repertoire)
+    fd, chemin_tmp = tempfile.mkstemp(dir=repertoire, suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(sidecar, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(chemin_tmp, chemin)
+    return chemin
+
+
+def sidecar_a_jour(chemin: str, repertoire: str) -> bool:
+    """Vrai si un sidecar valide existe déjà pour le contenu actuel du fichier"""
+    with open(chemin, 'rb') as f:
+        empreinte = cv_functions.calculer_empreinte_fichier(io.BytesIO(f.read()))
+    type_lecteur = LECTEURS_PAR_EXTENSION[os.path.splitext(chemin)[1].lower()][0]
+    try:
+        with open(cv_functions.chemin_sidecar(empreinte, repertoire), 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (sidecar.get('version_format') == cv_functions.VERSION_FORMAT_SIDECAR
+            and sidecar.get('version_lecteur') == cv_functions.VERSIONS_LECTEURS[type_lecteur])
+
+
+def indexer_repertoire(repertoire: str, sortie: str, forcer: bool = False) -> Dict[str, int]:
+    """Parcourt récursivement un répertoire et indexe chaque dossier PDF/DOCX"""
+    stats = {'indexes': 0, 'a_jour': 0, 'echecs': 0}
+
+    for racine, _, fichiers in os.walk(repertoire):
+        if os.path.abspath(racine).startswith(os.path.abspath(sortie)):
+            continue
+        for nom in sorted(fichiers):
+            if os.path.splitext(nom)[1].lower() not in LECTEURS_PAR_EXTENSION or nom.startswith('~$'):
+                continue
+            chemin = os.path.join(racine, nom)
+
+            if not forcer and sidecar_a_jour(chemin, sortie):
+                stats['a_jour'] += 1
+                continue
+
+            sidecar = construire_sidecar(chemin)
+            if sidecar is None:
+                print(f"  ✗ {chemin} : extraction impossible")
+                stats['echecs'] += 1
+                continue
+
+            ecrire_sidecar(sidecar, sortie)
+            print(f"  ✓ {chemin} → {sidecar['empreinte'][:12]} "
+                  f"({len(sidecar['texte'])} car.)")
+            stats['indexes'] += 1
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexe une bibliothèque de dossiers consultants")
+    parser.add_argument("repertoire", help="Répertoire contenant les dossiers PDF/DOCX")
+    parser.add_argument("--sortie", default=cv_functions.REPERTOIRE_INDEX_DOSSIERS,
+                        help="Répertoire des sidecars (défaut : %(default)s)")
+    parser.add_argument("--forcer", action="store_true", help="Réindexe même les dossiers à jour")
+    args = parser.parse_args()
+
+    stats = indexer_repertoire(args.repertoire, args.sortie, args.forcer)
+    print(f"{stats['indexes']} dossier(s) indexé(s), {stats['a_jour']} déjà à jour, {stats['echecs']} échec(s)")
+    return 1 if stats['echecs'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,18 @@ st.set_page_config(
     layout="wide"
 )
 
+# Nombre de pages de mission utilisées pour la détection anticipée du domaine
+PAGES_DETECTION_ANTICIPEE = 2
+
+# Libellés des modes de génération proposés dans la configuration
+MODES_GENERATION = {
+    MODE_GENERATION_UNIQUE: "Appel unique (streaming)",
+    MODE_GENERATION_SECTIONS: "Sections en parallèle",
+}
+
+# Quelques milliers de mots suffisent à détecter le domaine et construire le prompt
+BUDGET_TOKENS_MISSION_DEFAUT = 6000
+
 def main():
     st.title("🤖 Générateur de CV Clinkast - Analyse IA des Missions")
     st.markdown("*Optimisation intelligente du dossier de compétences selon la mission*")
@@ -32,23 +44,10 @@ def main():
             type=['pdf', 'txt'],
             help="Fichier PDF ou TXT contenant la description détaillée de la mission"
         )
-        
-        mission_text = None
-        if mission_file:
-            # Validation du fichier mission
-            if valider_fichier_upload(mission_file, ['pdf', 'txt'], 10):
-                if mission_file.type == "application/pdf":
-                    mission_text = lire_fichier_pdf(mission_file)
-                else:
-                    mission_text = lire_fichier_txt(mission_file)
-                
-                if mission_text:
-                    # Nettoyer le texte de la mission
-                    mission_text = nettoyer_texte_mission(mission_text)
-                    st.success(f"✅ Mission chargée ({len(mission_text.split())} mots)")
-                    with st.expander("Aperçu du contenu", expanded=False):
-                        st.text(mission_text[:500] + "..." if len(mission_text) > 500 else mission_text)
-    
+        # Validation du fichier mission
+        mission_valide = mission_file and valider_fichier_upload(mission_file, ['pdf', 'txt'], 10)
+        apercu_domaine = st.empty()
+
     with col2:
         st.markdown("**👤 Dossier de compétences actuel**")
         cv_file = st.file_uploader(
@@ -56,21 +55,67 @@ def main():
             type=['pdf', 'docx'],
             help="Document PDF ou Word contenant le dossier de compétences à adapter"
         )
-        
-        cv_text = None
-        if cv_file:
-            # Validation du fichier CV
-            if valider_fichier_upload(cv_file, ['pdf', 'docx'], 10):
-                if cv_file.type == "application/pdf":
-                    cv_text = lire_fichier_pdf(cv_file)
-                else:
-                    cv_text = lire_fichier_word(cv_file)
-                
-                if cv_text:
-                    st.success(f"✅ Dossier chargé ({len(cv_text.split())} mots)")
-                    with st.expander("Aperçu du contenu", expanded=False):
-                        st.text(cv_text[:500] + "..." if len(cv_text) > 500 else cv_text)
-    
+        # Validation du fichier CV
+        cv_valide = cv_file and valider_fichier_upload(cv_file, ['pdf', 'docx'], 10)
+
+    # Lecture simultanée des deux documents sur le pool partagé :
+    # la durée d'ingestion est celle du document le plus long, pas la somme des deux
+    premieres_pages = []
+
+    def detecter_domaine_premieres_pages(index, texte_page):
+        # Détection anticipée pendant le décodage des pages suivantes
+        if index < PAGES_DETECTION_ANTICIPEE:
+            premieres_pages.append(texte_page)
+            domaine = detecter_domaine_mission(" ".join(premieres_pages))
+            apercu_domaine.caption(f"🔎 Domaine pressenti : {domaine}")
+
+    # Le widget est défini plus bas dans le panneau de configuration ;
+    # sa valeur est relue ici à chaque rerun via session_state
+    budget_tokens = st.session_state.get("budget_tokens_mission", BUDGET_TOKENS_MISSION_DEFAUT)
+    rapport_extraction = {}
+    lecture_mission = soumettre_lecture(
+        lire_document,
+        mission_file,
+        rappel_page=detecter_domaine_premieres_pages,
+        budget_tokens=budget_tokens or None,
+        rapport=rapport_extraction
+    ) if mission_valide else None
+    rapport_extraction_cv = {}
+    lecture_cv = soumettre_lecture(lire_document, cv_file, rapport=rapport_extraction_cv) if cv_valide else None
+
+    mission_text = lecture_mission.result() if lecture_mission else None
+    cv_text = lecture_cv.result() if lecture_cv else None
+
+    with col1:
+        apercu_domaine.empty()
+        if rapport_extraction.get('pages_ignorees'):
+            st.caption(
+                f"✂️ Budget d'extraction atteint : {rapport_extraction['pages_lues']}/"
+                f"{rapport_extraction['pages_total']} pages décodées, "
+                f"{rapport_extraction['pages_ignorees']} pages ignorées (annexes)"
+            )
+
+        if mission_text:
+            # Nettoyer le texte de la mission
+            mission_text = nettoyer_texte_mission(mission_text)
+            st.success(f"✅ Mission chargée ({len(mission_text.split())} mots)")
+            with st.expander("Aperçu du contenu", expanded=False):
+                st.text(mission_text[:500] + "..." if len(mission_text) > 500 else mission_text)
+
+    with col2:
+        if rapport_extraction_cv.get('pages_depuis_cache'):
+            st.caption(
+                f"♻️ {rapport_extraction_cv['pages_depuis_cache']}/{rapport_extraction_cv['pages_total']} "
+                f"pages inchangées reprises du cache"
+            )
+
+        if cv_text:
+            st.success(f"✅ Dossier chargé ({len(cv_text.split())} mots)")
+            with st.expander("Aperçu du contenu", expanded=False):
+                st.text(cv_text[:500] + "..." if len(cv_text) > 500 else cv_text)
+
+    afficher_statistiques_cache()
+
     st.subheader("⚙️ Configuration")
     
     col_config1, col_config2 = st.columns([2, 1])
@@ -80,6 +125,32 @@ def main():
             "Nom du fichier de sortie",
             value="CV_optimise_mission.docx"
         )
+
+        st.number_input(
+            "Budget d'extraction de la mission (tokens, 0 = document entier)",
+            min_value=0,
+            max_value=100000,
+            value=BUDGET_TOKENS_MISSION_DEFAUT,
+            step=1000,
+            key="budget_tokens_mission",
+            help="Le décodage du PDF de mission s'arrête dès que ce volume de texte est atteint : "
+                 "les annexes et clauses juridiques en fin de document ne sont pas lues."
+        )
+
+        forcer_regeneration = st.checkbox(
+            "🔄 Forcer la régénération",
+            value=False,
+            help="Ignore la réponse mise en cache pour ces mêmes documents et relance l'analyse OpenAI."
+        )
+        
+        mode_generation = st.radio(
+            "Mode de génération",
+            options=[MODE_GENERATION_UNIQUE, MODE_GENERATION_SECTIONS],
+            format_func=lambda mode: MODES_GENERATION[mode],
+            horizontal=True,
+            help="En parallèle : un court appel de planification, puis une requête par section et par "
+                 "expérience exécutées simultanément. Plus rapide sur les longs parcours, qui ne sont plus tronqués."
+        )
         
         # Vérification de la configuration OpenAI
         test_client = configurer_openai()
@@ -113,24 +184,9 @@ def main():
             st.warning("⚠️ Veuillez charger tous les documents requis")
             return
         
-        # Étape 1: Lecture des documents (si pas déjà fait)
-        if not mission_text or not cv_text:
-            with st.spinner("📖 Lecture des documents..."):
-                if mission_file.type == "application/pdf":
-                    mission_content = lire_fichier_pdf(mission_file)
-                else:
-                    mission_content = lire_fichier_txt(mission_file)
-                
-                # Nettoyer le texte de mission
-                mission_content = nettoyer_texte_mission(mission_content)
-                
-                if cv_file.type == "application/pdf":
-                    cv_content = lire_fichier_pdf(cv_file)
-                else:
-                    cv_content = lire_fichier_word(cv_file)
-        else:
-            mission_content = mission_text
-            cv_content = cv_text
+        # Étape 1: Documents déjà lus au chargement, pas de nouvelle extraction
+        mission_content = mission_text
+        cv_content = cv_text
         
         if not mission_content or not cv_content:
             st.error("❌ Erreur lors de la lecture des documents")
@@ -138,10 +194,21 @@ def main():
         
         # Étape 2: Analyse du domaine et suggestions
         with st.spinner("🔍 Analyse du domaine d'activité..."):
-            domaine_detecte = detecter_domaine_mission(mission_content)
-            categories_suggerees = extraire_categories_connaissances_par_domaine(cv_content, domaine_detecte)
+            # Calculées une seule fois, sur un même instantané de la taxonomie : le rapport,
+            # le score et le prompt relisent ces analyses même si la taxonomie est rechargée entre-temps
+            taxonomie = obtenir_taxonomie()
+            if erreur_rechargement_taxonomie():
+                st.warning(erreur_rechargement_taxonomie())
+            analyse_mission = analyser_mission(mission_content, taxonomie)
+            analyse_cv = analyser_cv(cv_content, taxonomie)
+            domaine_detecte = analyse_mission.domaine
+            categories_suggerees = analyse_cv.categories_domaines([d for d, _ in analyse_mission.domaines])
         
-        st.info(f"📋 **Domaine détecté:** {domaine_detecte}")
+        if len(analyse_mission.domaines) > 1:
+            domaines_affiches = ", ".join(f"{d} ({poids:.0%})" for d, poids in analyse_mission.domaines)
+            st.info(f"📋 **Mission hybride - domaines détectés:** {domaines_affiches}")
+        else:
+            st.info(f"📋 **Domaine détecté:** {domaine_detecte}")
         
         if categories_suggerees:
             with st.expander("🎯 Catégories de compétences suggérées", expanded=False):
@@ -152,14 +219,20 @@ def main():
         # Étape 3: Analyse IA
         st.info("🤖 Analyse intelligente avec OpenAI en cours...")
         
-        donnees_optimisees = appeler_openai_pour_optimisation(mission_content, cv_content)
+        # Le template est chargé sur le pool pendant que la réponse arrive en streaming
+        chargement_template = soumettre_lecture(Document, template_path)
+        afficher_section = creer_apercu_progressif()
+        donnees_optimisees = appeler_openai_pour_optimisation(mission_content, cv_content, analyse_mission,
+                                                              forcer_regeneration, afficher_section,
+                                                              mode_generation)
         
         if not donnees_optimisees:
             st.error("❌ Erreur lors de l'analyse IA")
             return
         
         # Étape 4: Génération du rapport et affichage des résultats
-        rapport = generer_rapport_optimisation(cv_content, donnees_optimisees, mission_content)
+        rapport = generer_rapport_optimisation(cv_content, donnees_optimisees, mission_content,
+                                              analyse_mission, analyse_cv)
         
         st.success("✅ Analyse terminée avec succès !")
         
@@ -197,15 +270,17 @@ def main():
                 for cat in rapport['categories_competences'][:5]:
                     st.markdown(f"• {cat}")
         
+        afficher_explication_score(rapport['explication_score'], mission_content, cv_content)
+        
         with st.expander("📊 Données complètes optimisées", expanded=False):
             st.json(donnees_optimisees)
         
         # Étape 5: Génération du CV
         with st.spinner("📝 Génération du CV optimisé..."):
             try:
-                # Utiliser le template fixe
-                with open(template_path, 'rb') as template_file:
-                    doc = generer_cv_depuis_template_avec_entete_preserve(template_file, donnees_optimisees)
+                # Utiliser le template fixe, déjà chargé pendant l'analyse IA
+                doc = generer_cv_depuis_template_avec_entete_preserve(chargement_template.result(),
+                                                                      donnees_optimisees)
                 
                 if doc:
                     # Sauvegarder en mémoire
@@ -252,6 +327,107 @@ def main():
             except Exception as e:
                 st.error(f"❌ Erreur lors de la génération : {str(e)}")
 
+# Aperçu des sections du dossier optimisé, affichées au fil du streaming de la réponse
+def creer_apercu_progressif():
+    """Crée les emplacements de l'aperçu et retourne le rappel qui les remplit section par section"""
+    with st.container():
+        st.markdown("**📝 Dossier optimisé (aperçu en direct)**")
+        zones = {champ: st.empty() for champ in ('nom_consultant', 'points_forts', 'niveaux_intervention',
+                                                   'formations', 'connaissances')}
+        zone_experiences = st.container()
+    entete = {}
+    
+    def afficher_section(champ, index, valeur):
+        if champ == 'experiences':
+            # Chaque expérience est affichée dès qu'elle est complète ; la liste finale est ignorée
+            if index is not None and isinstance(valeur, dict):
+                with zone_experiences:
+                    st.markdown(f"💼 **{valeur.get('titre', '')}** — {valeur.get('entreprise', '')} "
+                                f"({valeur.get('periode', '')}) · {len(valeur.get('realisations', []))} réalisation(s)")
+        elif champ in ('nom_consultant', 'titre_du_poste'):
+            entete[champ] = valeur
+            zones['nom_consultant'].markdown(f"👤 **{entete.get('nom_consultant', '')}** "
+                                             f"— {entete.get('titre_du_poste', '')}")
+        elif champ in ('points_forts', 'niveaux_intervention') and isinstance(valeur, list):
+            titre = "Points forts" if champ == 'points_forts' else "Niveaux d'intervention"
+            zones[champ].markdown(f"**{titre} :** " + " · ".join(str(v) for v in valeur))
+        elif champ == 'formations' and isinstance(valeur, list):
+            zones[champ].markdown(f"🎓 {len(valeur)} formation(s)")
+        elif champ == 'connaissances' and isinstance(valeur, dict):
+            zones[champ].markdown("🔧 " + ", ".join(valeur))
+    
+    return afficher_section
+
+# Explication du score d'adéquation, à partir des positions mémorisées par l'analyse
+def _extrait(texte: str, position: int, marge: int = 40) -> str:
+    """Extrait d'un texte autour d'une position, sur une seule ligne"""
+    debut = max(position - marge, 0)
+    extrait = texte[debut:position + marge].replace("\n", " ").strip()
+    return f"…{extrait}…"
+
+def afficher_explication_score(explication, mission_content: str, cv_content: str):
+    """Détail du score d'adéquation : contribution de chaque compétence demandée par la mission"""
+    with st.expander("🔎 Détail du score d'adéquation", expanded=False):
+        if not explication.contributions:
+            st.markdown("Aucune compétence de la taxonomie n'a été repérée dans la mission.")
+            return
+        
+        st.caption(f"{explication.points:.2f} points sur {explication.points_max:.2f} possibles "
+                   f"(obligatoire ×1.5, standard ×1, souhaitée ×0.5 ; couverture selon fréquence et récence)")
+        for contribution in explication.contributions:
+            entete = f"**{contribution['competence']}** ({contribution['exigence']})"
+            if contribution['present']:
+                annee = contribution['annee'] or "année inconnue"
+                st.markdown(
+                    f"✅ {entete} : {contribution['points']:.2f} / {contribution['poids']:.1f} "
+                    f"— {contribution['occurrences_cv']} mention(s), {annee}"
+                )
+                st.caption(f"Mission : {_extrait(mission_content, contribution['positions_mission'][0])}  \n"
+                           f"Dossier : {_extrait(cv_content, contribution['positions_cv'][0])}")
+            else:
+                st.markdown(f"❌ {entete} : 0 / {contribution['poids']:.1f} — absente du dossier")
+                st.caption(f"Mission : {_extrait(mission_content, contribution['positions_mission'][0])}")
+
+# Statistiques du cache d'extraction (partagé par toutes les sessions du processus)
+def afficher_statistiques_cache():
+    stats = cache_extraction.statistiques()
+    with st.sidebar.expander("📈 Cache d'extraction", expanded=False):
+        st.metric("Taux de hit", f"{stats['taux_hit']:.0%}")
+        st.bar_chart({
+            "Requêtes": {
+                "Hits mémoire": stats['hits_memoire'],
+                "Hits disque": stats['hits_disque'],
+                "Misses": stats['misses']
+            }
+        })
+        st.caption(
+            f"{stats['entrees_memoire']} entrées en mémoire · "
+            f"{stats['ecritures_disque']} écritures disque · "
+            f"{stats['evictions_disque']} évictions · "
+            f"{compteurs_sidecars['hits']} dossiers servis par l'index"
+        )
+        stats_reponses = cache_reponses.statistiques()
+        st.caption(
+            f"Réponses OpenAI : {stats_reponses['entrees']} en cache · "
+            f"{stats_reponses['hits']} hits · {stats_reponses['misses']} misses · "
+            f"{stats_reponses['evictions']} évictions"
+        )
+        if statistiques_prompts['generations']:
+            st.caption(
+                f"Prompts : {statistiques_prompts['generations']} génération(s), "
+                f"{statistiques_prompts['requetes']} requête(s), "
+                f"{statistiques_prompts['tokens_factures'] or statistiques_prompts['tokens_estimes']} tokens en entrée, "
+                f"{statistiques_prompts['tokens_economises']} tokens de consignes évités"
+            )
+        stats_client = statistiques_client_openai
+        if stats_client['creations']:
+            prechauffage = (f"connexion établie en {stats_client['duree_prechauffage_ms']:.0f} ms"
+                            if stats_client['duree_prechauffage_ms'] is not None else "connexion en cours")
+            st.caption(
+                f"Client OpenAI partagé : créé en {stats_client['duree_creation_ms']:.0f} ms, "
+                f"{prechauffage}, réutilisé {stats_client['reutilisations']} fois"
+            )
+
 # Guide d'utilisation
 def afficher_guide():
     st.markdown("---")
@@ -9,34 +9,13 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def valider_fichier_upload(fichier, types_autorises: List[str], taille_max_mb: int = 10) -> bool:
-    """
-    Valide un fichier uploadé selon les critères spécifiés
-    
-    Args:
-        fichier: Fichier uploadé via Streamlit
-        types_autorises: Liste des extensions autorisées (ex: ['pdf', 'docx'])
-        taille_max_mb: Taille maximale en MB
-    
-    Returns:
-        bool: True si valide, False sinon
-    """
-    if not fichier:
-        return False
-    
-    # Vérifier l'extension
-    extension = fichier.name.split('.')[-1].lower()
-    if extension not in types_autorises:
-        st.error(f"Type de fichier non autorisé. Extensions acceptées: {', '.join(types_autorises)}")
-        return False
-    
-    # Vérifier la taille
-    taille_mb = len(fichier.getvalue()) / (1024 * 1024)
-    if taille_mb > taille_max_mb:
-        st.error(f"Fichier trop volumineux ({taille_mb:.1f} MB). Taille max: {taille_max_mb} MB")
-        return False
-    
-    return True
+# La validation des uploads (taille par seek/tell, sniffing des premiers octets,
+# contrôle du trailer PDF) est partagée avec cv_functions
+from cv_functions import valider_fichier_upload
+
+# Détection du domaine et catégories de connaissances : même taxonomie que l'application
+# (taxonomie_competences.json), plus de tables dupliquées ici
+from cv_functions import detecter_domaine_mission, extraire_categories_connaissances_par_domaine
 
 def nettoyer_texte_mission(texte: str) -> str:
     """
@@ -60,165 +39,6 @@ def nettoyer_texte_mission(texte: str) -> str:
     
     return texte.strip()
 
-def detecter_domaine_mission(texte_mission: str) -> str:
-    """
-    Détecte le domaine d'activité principal de la mission
-    
-    Args:
-        texte_mission: Texte de la description de mission
-    
-    Returns:
-        str: Domaine détecté
-    """
-    
-    domaines_keywords = {
-        'IT/Tech': [
-            'développeur', 'programmeur', 'software', 'application', 'système', 'réseau',
-            'base de données', 'cloud', 'devops', 'api', 'framework', 'coding', 'javascript',
-            'python', 'java', 'docker', 'kubernetes', 'git', 'agile', 'scrum'
-        ],
-        'Marketing': [
-            'marketing', 'communication', 'campagne', 'publicité', 'brand', 'social media',
-            'seo', 'sem', 'analytics', 'crm', 'lead', 'conversion', 'content', 'digital'
-        ],
-        'Finance': [
-            'finance', 'comptabilité', 'budget', 'trésorerie', 'audit', 'contrôle gestion',
-            'reporting financier', 'analyse financière', 'investissement', 'risque'
-        ],
-        'RH': [
-            'ressources humaines', 'recrutement', 'formation', 'paie', 'talent',
-            'compétences', 'évaluation', 'carrière', 'mobilité', 'sirh'
-        ],
-        'Logistique': [
-            'logistique', 'supply chain', 'approvisionnement', 'stock', 'transport',
-            'entreposage', 'distribution', 'procurement', 'planification'
-        ],
-        'Vente': [
-            'commercial', 'vente', 'client', 'négociation', 'business development',
-            'account manager', 'prospection', 'closing', 'pipeline'
-        ],
-        'Consulting': [
-            'consultant', 'conseil', 'stratégie', 'transformation', 'audit',
-            'accompagnement', 'optimisation', 'expertise'
-        ],
-        'Santé': [
-            'médical', 'santé', 'patient', 'soins', 'clinique', 'hôpital',
-            'pharmacie', 'thérapie', 'diagnostic'
-        ],
-        'Education': [
-            'formation', 'enseignement', 'pédagogie', 'cours', 'étudiant',
-            'apprentissage', 'curriculum', 'évaluation pédagogique'
-        ],
-        'Juridique': [
-            'juridique', 'droit', 'contrat', 'compliance', 'réglementation',
-            'contentieux', 'avocat', 'juriste'
-        ]
-    }
-    
-    texte_lower = texte_mission.lower()
-    scores = {}
-    
-    for domaine, keywords in domaines_keywords.items():
-        score = sum(1 for keyword in keywords if keyword in texte_lower)
-        if score > 0:
-            scores[domaine] = score
-    
-    if scores:
-        return max(scores.items(), key=lambda x: x[1])[0]
-    
-    return 'Général'
-
-def extraire_categories_connaissances_par_domaine(texte_cv: str, domaine: str) -> Dict[str, List[str]]:
-    """
-    Extrait et suggère des catégories de connaissances selon le domaine
-    
-    Args:
-        texte_cv: Contenu du CV
-        domaine: Domaine détecté de la mission
-    
-    Returns:
-        Dict avec les catégories suggérées et mots-clés trouvés
-    """
-    
-    categories_par_domaine = {
-        'IT/Tech': {
-            'Langages de programmation': ['python', 'java', 'javascript', 'c#', 'php', 'ruby', 'go', 'rust'],
-            'Frameworks et Libraries': ['react', 'angular', 'vue', 'django', 'flask', 'spring', 'laravel'],
-            'Bases de données': ['mysql', 'postgresql', 'mongodb', 'oracle', 'redis', 'elasticsearch'],
-            'Cloud et DevOps': ['aws', 'azure', 'gcp', 'docker', 'kubernetes', 'terraform', 'jenkins'],
-            'Outils et IDE': ['git', 'github', 'gitlab', 'vscode', 'intellij', 'eclipse', 'jira'],
-            'Méthodologies': ['agile', 'scrum', 'kanban', 'devops', 'ci/cd', 'tdd', 'bdd']
-        },
-        'Marketing': {
-            'Outils Marketing': ['hubspot', 'marketo', 'mailchimp', 'salesforce', 'pardot'],
-            'Analytics et Mesure': ['google analytics', 'tag manager', 'data studio', 'tableau'],
-            'Réseaux Sociaux': ['facebook ads', 'google ads', 'linkedin', 'instagram', 'twitter'],
-            'CRM et Automation': ['salesforce', 'hubspot', 'pipedrive', 'zoho', 'crm'],
-            'Design et Création': ['photoshop', 'illustrator', 'canva', 'figma', 'indesign'],
-            'SEO et Content': ['seo', 'sem', 'content marketing', 'wordpress', 'cms']
-        },
-        'Finance': {
-            'Logiciels Financiers': ['sap', 'oracle', 'sage', 'cegid', 'quickbooks'],
-            'Outils d\'Analyse': ['excel', 'power bi', 'tableau', 'qlikview', 'r', 'python'],
-            'Réglementation': ['ifrs', 'pcg', 'sox', 'bâle', 'solvabilité'],
-            'Reporting': ['consolidation', 'reporting', 'business intelligence', 'kpi'],
-            'Contrôle et Audit': ['contrôle interne', 'audit', 'risk management', 'compliance'],
-            'Treasury': ['trésorerie', 'cash management', 'forex', 'dérivés', 'financement']
-        },
-        'RH': {
-            'SIRH': ['sap hr', 'workday', 'adp', 'cornerstone', 'talentsoft', 'sirh'],
-            'Recrutement': ['ats', 'linkedin recruiter', 'jobboard', 'sourcing', 'assessment'],
-            'Formation': ['lms', 'e-learning', 'moodle', 'articulate', 'captivate'],
-            'Paie': ['silae', 'sage paie', 'adp', 'meta4', 'système paie'],
-            'Évaluation': ['entretiens', 'feedback 360', 'assessment center', 'potentiel'],
-            'Droit Social': ['droit travail', 'convention collective', 'code travail', 'prud\'hommes']
-        },
-        'Logistique': {
-            'Systèmes WMS': ['wms', 'warehouse management', 'manhattan', 'sap wm', 'reflex'],
-            'Supply Chain': ['planification', 'mrp', 'prévision', 'demand planning'],
-            'Transport': ['tms', 'transport management', 'optimisation tournées'],
-            'Outils Logistiques': ['sap mm', 'oracle wms', 'pkms', 'generix'],
-            'Standards': ['lean', 'six sigma', '5s', 'kanban', 'flux tiré'],
-            'Réglementation': ['adr', 'douane', 'incoterms', 'réglementation transport']
-        },
-        'Vente': {
-            'CRM': ['salesforce', 'hubspot', 'pipedrive', 'zoho', 'dynamics'],
-            'Prospection': ['sales navigator', 'hunter', 'lemlist', 'outreach'],
-            'Analytics Commercial': ['tableau', 'power bi', 'qlikview', 'looker'],
-            'E-commerce': ['shopify', 'magento', 'woocommerce', 'prestashop'],
-            'Communication': ['slack', 'teams', 'zoom', 'gotomeeting'],
-            'Méthodologies': ['spin selling', 'challenger sale', 'inbound', 'account based']
-        },
-        'Santé': {
-            'Systèmes Médicaux': ['dpi', 'ris', 'pacs', 'lims', 'pharma'],
-            'Réglementation': ['gdp', 'gcp', 'ich', 'fda', 'ema', 'ansm'],
-            'Qualité': ['iso 13485', 'iso 15189', 'iso 27001', 'validation'],
-            'Outils Statistiques': ['sas', 'r', 'spss', 'stata', 'clinical trials'],
-            'Standards': ['hl7', 'dicom', 'snomed', 'icd-10'],
-            'Domaines': ['pharmacovigilance', 'affaires réglementaires', 'clinical research']
-        }
-    }
-    
-    if domaine not in categories_par_domaine:
-        # Domaine généraliste ou non spécifique
-        return {
-            'Outils et Logiciels': [],
-            'Compétences Techniques': [],
-            'Méthodologies': [],
-            'Certifications': [],
-            'Langues': []
-        }
-    
-    texte_lower = texte_cv.lower()
-    categories_trouvees = {}
-    
-    for categorie, keywords in categories_par_domaine[domaine].items():
-        mots_trouves = [keyword for keyword in keywords if keyword in texte_lower]
-        if mots_trouves:
-            categories_trouvees[categorie] = mots_trouves
-    
-    return categories_trouvees
-
 def calculer_score_adequation(dossier_competences: str, mots_cles_mission: Dict[str, List[str]]) -> float:
     """
     Calcule un score d'adéquation entre le dossier et la mission